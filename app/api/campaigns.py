@@ -1,79 +1,98 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from ..database import get_session
-from ..models.models import Campaign, CampaignUser, User, NotificationStatus
-from ..schemas.campaign import CampaignCreate, Campaign as CampaignSchema, CampaignStatus
+from sqlalchemy.orm import joinedload
+from ..config import settings
+from ..database import get_session, get_read_session, async_session
+from ..cache import campaign_cache
+from ..redis_client import get_redis
+from ..models.models import Campaign, CampaignUser, NotificationStatus
+from ..services.audience import materialize_recipients, UsersNotFoundError
+from ..services.partitions import partition_exists
+from ..services.campaign_stats import CampaignStats, get_stats, events_channel
+from .pagination import PageParams, set_next_cursor, stream_ndjson
+from ..schemas.campaign import (
+    CampaignCreate, CampaignCreated, CampaignStatus, CampaignSummary,
+    CampaignUserStatus
+)
+from ..tasks.celery_app import queue_for
 from ..tasks.notification_tasks import send_notifications
 
 router = APIRouter()
 
-@router.post("/", response_model=CampaignSchema)
+@router.post("/", response_model=CampaignCreated)
 async def create_campaign(
     campaign: CampaignCreate,
     session: AsyncSession = Depends(get_session)
 ):
-    # Проверяем существование всех пользователей
-    for user_id in campaign.user_ids:
-        user = await session.get(User, user_id)
-        if not user:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Пользователь с id {user_id} не найден"
-            )
-    
     # Создаем кампанию
-    db_campaign = Campaign(text=campaign.text)
+    db_campaign = Campaign(text=campaign.text, priority=campaign.priority)
     session.add(db_campaign)
-    await session.commit()
-    await session.refresh(db_campaign)
+    await session.flush()
+    # Секции создаются заранее задачей ensure_partitions; без секции
+    # получатели попали бы в секцию по умолчанию
+    if not await partition_exists(session, db_campaign.id):
+        await session.rollback()
+        raise HTTPException(
+            status_code=503,
+            detail="Секция получателей для кампании еще не создана, повторите позже"
+        )
 
-    # Добавляем пользователей в кампанию
-    for user_id in campaign.user_ids:
-        campaign_user = CampaignUser(
-            campaign_id=db_campaign.id,
-            user_id=user_id
+    # Добавляем получателей одним запросом вместе с проверкой их существования
+    try:
+        total = await materialize_recipients(session, db_campaign.id, campaign)
+    except UsersNotFoundError as e:
+        await session.rollback()
+        raise HTTPException(
+            status_code=404,
+            detail=f"Пользователь с id {e.user_ids[0]} не найден"
         )
-        session.add(campaign_user)
-    
+    if total == 0:
+        await session.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail="Аудитория кампании пуста"
+        )
+
     await session.commit()
     
-    # Загружаем кампанию с пользователями для ответа
-    stmt = select(Campaign).where(Campaign.id == db_campaign.id).options(
-        selectinload(Campaign.users).selectinload(CampaignUser.user)
-    )
-    result = await session.execute(stmt)
-    campaign_with_users = result.scalar_one()
-    
     # Запускаем асинхронную отправку уведомлений
-    send_notifications.delay(db_campaign.id)
+    send_notifications.apply_async(
+        (db_campaign.id,), queue=queue_for(db_campaign.priority.value)
+    )
     
-    return campaign_with_users
+    return CampaignCreated(
+        id=db_campaign.id,
+        text=db_campaign.text,
+        priority=db_campaign.priority,
+        created_at=db_campaign.created_at,
+        total_notifications=total
+    )
 
 @router.get("/{campaign_id}/status", response_model=CampaignStatus)
 async def get_campaign_status(
     campaign_id: int,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_read_session)
 ):
-    # Загружаем кампанию с пользователями
-    stmt = select(Campaign).where(Campaign.id == campaign_id).options(
-        selectinload(Campaign.users).selectinload(CampaignUser.user)
-    )
-    result = await session.execute(stmt)
-    campaign = result.scalar_one_or_none()
-    
+    campaign = await campaign_cache.get(campaign_id)
     if not campaign:
         raise HTTPException(
             status_code=404,
             detail="Кампания не найдена"
         )
     
-    # Подсчитываем статистику - ✅ Исправлено: правильное обращение к enum
-    total_notifications = len(campaign.users)
-    sent_notifications = sum(1 for cu in campaign.users if cu.status == NotificationStatus.SENT)
-    failed_notifications = sum(1 for cu in campaign.users if cu.status == NotificationStatus.FAILED)
-    pending_notifications = sum(1 for cu in campaign.users if cu.status == NotificationStatus.PENDING)
+    # Счетчики из Redis, при их отсутствии - один GROUP BY запрос
+    stats = await get_stats(session, campaign_id)
+    total_notifications = stats.total
+    sent_notifications = stats.sent
+    # Окончательно неотправленные: постоянные ошибки и исчерпанные повторы
+    failed_notifications = stats.failed + stats.dead_letter
+    pending_notifications = stats.pending
     
     # Определяем общий статус кампании
     if failed_notifications == total_notifications:
@@ -84,25 +103,176 @@ async def get_campaign_status(
         status = "in_progress"
     else:
         status = "pending"
-    
+
     return CampaignStatus(
         id=campaign.id,
         status=status,
         total_notifications=total_notifications,
         sent_notifications=sent_notifications,
         failed_notifications=failed_notifications,
+        dead_letter_notifications=stats.dead_letter,
         pending_notifications=pending_notifications,
-        created_at=campaign.created_at
+        created_at=campaign.created_at,
+        started_at=campaign.started_at,
+        completed_at=campaign.completed_at,
+        throughput=stats.rate(campaign.started_at, campaign.completed_at),
+        archived_at=campaign.archived_at
     )
 
-@router.get("/", response_model=list[CampaignSchema])
-async def get_campaigns(
-    session: AsyncSession = Depends(get_session)
+@router.get("/{campaign_id}/events")
+async def stream_campaign_events(
+    campaign_id: int,
+    session: AsyncSession = Depends(get_read_session)
+):
+    """Поток событий прогресса кампании (Server-Sent Events)"""
+    campaign = await campaign_cache.get(campaign_id)
+    if not campaign:
+        raise HTTPException(
+            status_code=404,
+            detail="Кампания не найдена"
+        )
+    stats = await get_stats(session, campaign_id)
+    # Не держим соединение с базой на все время потока
+    await session.close()
+
+    return StreamingResponse(
+        _campaign_events(
+            campaign_id, stats, campaign.started_at, campaign.completed_at
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _progress_event(
+    stats: CampaignStats,
+    started_at: Optional[datetime],
+    completed_at: Optional[datetime] = None,
+    delta_sent: int = 0,
+    delta_failed: int = 0,
+) -> dict:
+    rate = stats.rate(started_at, completed_at)
+    return {
+        "total": stats.total,
+        "sent": stats.sent,
+        "failed": stats.failed + stats.dead_letter,
+        "dead_letter": stats.dead_letter,
+        "pending": stats.pending,
+        "delta_sent": delta_sent,
+        "delta_failed": delta_failed,
+        "rate": rate,
+        "eta_seconds": round(stats.pending / rate, 1) if rate else None,
+    }
+
+async def _campaign_events(
+    campaign_id: int,
+    stats: CampaignStats,
+    started_at: Optional[datetime],
+    completed_at: Optional[datetime],
+) -> AsyncIterator[str]:
+    yield _sse("progress", _progress_event(stats, started_at, completed_at))
+    if completed_at:
+        yield _sse("completed", {"completed_at": completed_at})
+        return
+
+    pubsub = get_redis().pubsub()
+    await pubsub.subscribe(events_channel(campaign_id))
+    loop = asyncio.get_running_loop()
+    last_event_at = loop.time()
+    try:
+        while True:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=settings.SSE_HEARTBEAT_INTERVAL,
+            )
+            if message is None:
+                # None возвращается и для пропущенных служебных сообщений
+                if loop.time() - last_event_at < settings.SSE_HEARTBEAT_INTERVAL:
+                    continue
+                last_event_at = loop.time()
+                # Событие о завершении могло прийти до подписки
+                async with async_session() as session:
+                    completed_at = await session.scalar(
+                        select(Campaign.completed_at).where(Campaign.id == campaign_id)
+                    )
+                if completed_at:
+                    yield _sse("completed", {"completed_at": completed_at})
+                    return
+                yield ": keep-alive\n\n"
+                continue
+
+            last_event_at = loop.time()
+            event = json.loads(message["data"])
+            if event["type"] == "completed":
+                yield _sse("completed", {"completed_at": event["completed_at"]})
+                return
+            stats = CampaignStats(
+                total=event["total"],
+                sent=event["sent"],
+                failed=event["failed"],
+                dead_letter=event["dead_letter"],
+            )
+            yield _sse("progress", _progress_event(
+                stats, started_at,
+                delta_sent=event["delta_sent"],
+                delta_failed=event["delta_failed"],
+            ))
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+
+@router.get("/{campaign_id}/recipients", response_model=list[CampaignUserStatus])
+async def get_campaign_recipients(
+    campaign_id: int,
+    response: Response,
+    status: Optional[NotificationStatus] = Query(
+        None, description="Только получатели с этим статусом, например dead_letter"
+    ),
+    page: PageParams = Depends(),
+    session: AsyncSession = Depends(get_read_session)
 ):
-    """Получение списка всех кампаний"""
-    stmt = select(Campaign).options(
-        selectinload(Campaign.users).selectinload(CampaignUser.user)
+    """Получатели кампании со статусами доставки, keyset-пагинация по ID пользователя"""
+    campaign = await campaign_cache.get(campaign_id)
+    if not campaign:
+        raise HTTPException(
+            status_code=404,
+            detail="Кампания не найдена"
+        )
+
+    stmt = (
+        select(CampaignUser)
+        .where(CampaignUser.campaign_id == campaign_id)
+        .options(joinedload(CampaignUser.user))
+        .order_by(CampaignUser.user_id)
     )
-    result = await session.execute(stmt)
+    if status is not None:
+        stmt = stmt.where(CampaignUser.status == status)
+    if page.cursor is not None:
+        stmt = stmt.where(CampaignUser.user_id > page.cursor)
+    if page.stream:
+        return stream_ndjson(stmt, CampaignUserStatus)
+
+    result = await session.execute(stmt.limit(page.limit))
+    recipients = result.scalars().all()
+    set_next_cursor(response, recipients, page.limit, key=lambda cu: cu.user_id)
+    return recipients
+
+@router.get("/", response_model=list[CampaignSummary])
+async def get_campaigns(
+    response: Response,
+    page: PageParams = Depends(),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """Получение списка кампаний без получателей, keyset-пагинация по ID"""
+    stmt = select(Campaign).order_by(Campaign.id)
+    if page.cursor is not None:
+        stmt = stmt.where(Campaign.id > page.cursor)
+    if page.stream:
+        return stream_ndjson(stmt, CampaignSummary)
+
+    result = await session.execute(stmt.limit(page.limit))
     campaigns = result.scalars().all()
-    return campaigns
\ No newline at end of file
+    set_next_cursor(response, campaigns, page.limit)
+    return campaigns
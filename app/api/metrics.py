@@ -0,0 +1,34 @@
+import logging
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from ..metrics import QUEUE_DEPTH
+from ..redis_client import get_redis
+from ..services.retries import RETRY_QUEUE_KEY
+from ..tasks.celery_app import MAINTENANCE_QUEUE, PRIORITY_QUEUES
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+async def _update_queue_depth():
+    redis = get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        queues = [*PRIORITY_QUEUES.values(), MAINTENANCE_QUEUE]
+        for queue in queues:
+            pipe.llen(queue)
+        pipe.zcard(RETRY_QUEUE_KEY)
+        *lengths, retries = await pipe.execute()
+    for queue, length in zip(queues, lengths):
+        QUEUE_DEPTH.labels(queue).set(length)
+    QUEUE_DEPTH.labels("retries").set(retries)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики в формате Prometheus"""
+    try:
+        await _update_queue_depth()
+    except Exception as e:
+        logger.warning(f"Не удалось получить длину очередей: {str(e)}")
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,62 @@
+from typing import AsyncIterator, Callable, Optional, Sequence, Type
+from fastapi import Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import Select
+from ..config import settings
+from ..database import async_session, async_read_session, replica_usable
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams:
+    """Параметры keyset-пагинации списков"""
+
+    def __init__(
+        self,
+        limit: int = Query(
+            settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE,
+            description="Количество записей на странице"
+        ),
+        cursor: Optional[int] = Query(
+            None, description="Значение из заголовка X-Next-Cursor предыдущей страницы"
+        ),
+        stream: bool = Query(
+            False, description="Потоковая выдача всех записей после cursor в формате NDJSON"
+        ),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.stream = stream
+
+
+def set_next_cursor(
+    response: Response,
+    items: Sequence,
+    limit: int,
+    key: Callable = lambda item: item.id,
+):
+    """Передача курсора следующей страницы, если текущая заполнена целиком"""
+    if len(items) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = str(key(items[-1]))
+
+
+def stream_ndjson(stmt: Select, schema: Type[BaseModel]) -> StreamingResponse:
+    """
+    Потоковая выдача результатов запроса в формате NDJSON
+
+    Строки сериализуются по мере чтения из базы данных серверным курсором,
+    поэтому память не зависит от размера выборки. Чтение идет с реплики,
+    если она не отстает.
+    """
+    async def rows() -> AsyncIterator[str]:
+        maker = async_read_session if await replica_usable() else async_session
+        async with maker() as session:
+            result = await session.stream_scalars(
+                stmt.execution_options(yield_per=settings.STREAM_BATCH_SIZE)
+            )
+            async for item in result:
+                yield schema.model_validate(item).model_dump_json() + "\n"
+
+    return StreamingResponse(rows(), media_type=NDJSON_MEDIA_TYPE)
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from ..database import get_session
+from ..database import get_session, get_read_session
+from ..cache import user_cache
 from ..models.models import User
-from ..schemas.user import UserCreate, User as UserSchema, UserUpdate
+from .pagination import PageParams, set_next_cursor, stream_ndjson
+from ..schemas.user import UserCreate, User as UserSchema, UserUpdate, BulkImportResult
+from ..services.user_import import (
+    UserImporter, iter_lines, parse_media_type, SUPPORTED_MEDIA_TYPES
+)
 
 router = APIRouter()
 
@@ -25,25 +30,50 @@ async def create_user(
     session.add(db_user)
     await session.commit()
     await session.refresh(db_user)
+    await user_cache.invalidate(db_user.id)
     return db_user
 
+@router.post("/bulk", response_model=BulkImportResult)
+async def bulk_import_users(
+    request: Request,
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Массовый импорт пользователей из потока CSV (с заголовком email,telegram_id)
+    или NDJSON. Существующие по email пользователи обновляются.
+    """
+    media_type = parse_media_type(request.headers.get("content-type"))
+    if media_type not in SUPPORTED_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Поддерживаются форматы: {', '.join(SUPPORTED_MEDIA_TYPES)}"
+        )
+
+    importer = UserImporter(session)
+    return await importer.run(iter_lines(request.stream()), media_type)
+
 @router.get("/", response_model=list[UserSchema])
 async def get_users(
-    session: AsyncSession = Depends(get_session)
+    response: Response,
+    page: PageParams = Depends(),
+    session: AsyncSession = Depends(get_read_session)
 ):
-    """Получение списка всех пользователей"""
-    stmt = select(User)
-    result = await session.execute(stmt)
+    """Получение списка пользователей с keyset-пагинацией по ID"""
+    stmt = select(User).order_by(User.id)
+    if page.cursor is not None:
+        stmt = stmt.where(User.id > page.cursor)
+    if page.stream:
+        return stream_ndjson(stmt, UserSchema)
+
+    result = await session.execute(stmt.limit(page.limit))
     users = result.scalars().all()
+    set_next_cursor(response, users, page.limit)
     return users
 
 @router.get("/{user_id}", response_model=UserSchema)
-async def get_user(
-    user_id: int,
-    session: AsyncSession = Depends(get_session)
-):
+async def get_user(user_id: int):
     """Получение пользователя по ID"""
-    user = await session.get(User, user_id)
+    user = await user_cache.get(user_id)
     if not user:
         raise HTTPException(
             status_code=404,
@@ -72,4 +102,5 @@ async def update_user(
     
     await session.commit()
     await session.refresh(db_user)
+    await user_cache.invalidate(user_id)
     return db_user
\ No newline at end of file
@@ -0,0 +1,200 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Generic, Iterable, List, Optional, Type, TypeVar
+from pydantic import BaseModel
+from sqlalchemy import select, any_, bindparam, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+from .config import settings
+from .database import async_session
+from .models.models import User, Campaign
+from .redis_client import get_redis
+from .schemas.campaign import CampaignSummary
+from .schemas.user import User as UserSchema
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound=BaseModel)
+
+# Запись загруженных из базы значений, только если с начала загрузки
+# не было инвалидаций (версия пространства имен не изменилась)
+FILL_SCRIPT = """
+if (redis.call('GET', KEYS[1]) or '') ~= ARGV[1] then
+    return 0
+end
+for i = 2, #KEYS do
+    redis.call('SET', KEYS[i], ARGV[i + 1], 'EX', ARGV[2])
+end
+return 1
+"""
+
+
+class LocalCache:
+    """LRU кэш процесса с ограниченным временем жизни записей"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def delete(self, key):
+        self._items.pop(key, None)
+
+    def clear(self):
+        self._items.clear()
+
+
+class ReadThroughCache(Generic[T]):
+    """
+    Двухуровневый кэш чтения: LRU процесса и Redis
+
+    Промахи обоих уровней загружаются из базы одним запросом на пакет
+    ключей и записываются в оба уровня. Записи процесса живут недолго
+    (`local_ttl`): инвалидация удаляет ключи из Redis и локального кэша
+    только своего процесса. Недоступность Redis не мешает чтению из базы.
+
+    Инвалидация увеличивает версию пространства имен; загруженные значения
+    не записываются, если версия изменилась за время загрузки, поэтому
+    значение, прочитанное до изменения, не перезапишет удаление ключа.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        schema: Type[T],
+        load: Callable[[List[int]], Awaitable[Dict[int, T]]],
+        ttl: Optional[int] = None,
+        local_ttl: Optional[float] = None,
+        local_size: Optional[int] = None,
+    ):
+        self.namespace = namespace
+        self.schema = schema
+        self.load = load
+        self.ttl = ttl or settings.CACHE_TTL
+        self.local = LocalCache(
+            local_size or settings.CACHE_LOCAL_SIZE,
+            local_ttl if local_ttl is not None else settings.CACHE_LOCAL_TTL,
+        )
+
+    def _key(self, key: int) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    @property
+    def _version_key(self) -> str:
+        return f"cache:{self.namespace}:version"
+
+    async def get(self, key: int) -> Optional[T]:
+        """Значение по ключу или None, если его нет в базе"""
+        return (await self.get_many([key])).get(key)
+
+    async def get_many(self, keys: Iterable[int]) -> Dict[int, T]:
+        """Значения по ключам; отсутствующие в базе ключи в результат не входят"""
+        found: Dict[int, T] = {}
+        missing: List[int] = []
+        for key in dict.fromkeys(keys):
+            value = self.local.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        if not missing:
+            return found
+
+        redis_ok = True
+        try:
+            *cached, version = await get_redis().mget(
+                [self._key(key) for key in missing] + [self._version_key]
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать кэш {self.namespace} из Redis: {str(e)}")
+            cached, version, redis_ok = [None] * len(missing), None, False
+
+        not_cached: List[int] = []
+        for key, raw in zip(missing, cached):
+            if raw is None:
+                not_cached.append(key)
+                continue
+            value = self.schema.model_validate_json(raw)
+            self.local.set(key, value)
+            found[key] = value
+        if not not_cached:
+            return found
+
+        loaded = await self.load(not_cached)
+        found.update(loaded)
+        if not loaded:
+            return found
+        if redis_ok:
+            try:
+                cache_keys = [self._key(key) for key in loaded]
+                values = [value.model_dump_json() for value in loaded.values()]
+                stored = await get_redis().eval(
+                    FILL_SCRIPT, len(cache_keys) + 1, self._version_key, *cache_keys,
+                    version or "", self.ttl, *values,
+                )
+            except Exception as e:
+                logger.warning(f"Не удалось записать кэш {self.namespace} в Redis: {str(e)}")
+                stored = True
+            if not stored:
+                # Данные изменились во время загрузки: не кэшируем их
+                return found
+        for key, value in loaded.items():
+            self.local.set(key, value)
+        return found
+
+    async def invalidate(self, *keys: int):
+        """Удаление ключей после изменения данных в базе"""
+        if not keys:
+            return
+        for key in keys:
+            self.local.delete(key)
+        try:
+            async with get_redis().pipeline(transaction=True) as pipe:
+                pipe.incr(self._version_key)
+                pipe.delete(*(self._key(key) for key in keys))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Не удалось инвалидировать кэш {self.namespace}: {str(e)}")
+
+
+def _ids_param(ids: List[int]):
+    return bindparam("ids", ids, type_=ARRAY(Integer))
+
+
+async def _load_users(ids: List[int]) -> Dict[int, UserSchema]:
+    async with async_session() as session:
+        result = await session.scalars(select(User).where(User.id == any_(_ids_param(ids))))
+        return {user.id: UserSchema.model_validate(user) for user in result}
+
+
+async def _load_campaigns(ids: List[int]) -> Dict[int, CampaignSummary]:
+    async with async_session() as session:
+        result = await session.scalars(
+            select(Campaign).where(Campaign.id == any_(_ids_param(ids)))
+        )
+        return {campaign.id: CampaignSummary.model_validate(campaign) for campaign in result}
+
+
+# Пользователи меняются только через API и импорт, метаданные кампании -
+# при создании и при отметках о начале и завершении рассылки
+user_cache: ReadThroughCache[UserSchema] = ReadThroughCache("user", UserSchema, _load_users)
+campaign_cache: ReadThroughCache[CampaignSummary] = ReadThroughCache(
+    "campaign", CampaignSummary, _load_campaigns
+)
@@ -18,12 +18,37 @@ class Settings(BaseSettings):
     POSTGRES_HOST: str = "localhost"
     POSTGRES_PORT: str = "5432"
     DATABASE_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 10  # Постоянных соединений в пуле
+    DB_MAX_OVERFLOW: int = 20  # Дополнительных соединений при нагрузке
+    DB_POOL_TIMEOUT: float = 30.0  # Ожидание свободного соединения, секунды
+    DB_POOL_RECYCLE: int = 1800  # Переоткрытие соединений старше, секунды
+    DB_COMMAND_TIMEOUT: Optional[float] = 60.0  # Таймаут запроса, секунды
+    CAMPAIGN_PARTITIONS_AHEAD: int = 5  # Секций campaign_users, создаваемых заранее
+    PARTITION_CHECK_INTERVAL: float = 600.0  # Период создания секций, секунды
+
+    # Реплика для чтения (опционально, те же пользователь, пароль и база)
+    REPLICA_POSTGRES_HOST: Optional[str] = None
+    REPLICA_POSTGRES_PORT: Optional[str] = None
+    REPLICA_DATABASE_URL: Optional[str] = None
+    REPLICA_POOL_SIZE: int = 10
+    REPLICA_MAX_OVERFLOW: int = 20
+    REPLICA_POOL_TIMEOUT: float = 5.0
+    REPLICA_COMMAND_TIMEOUT: Optional[float] = 30.0
+    REPLICA_MAX_LAG: float = 5.0  # Допустимое отставание реплики, секунды
+    REPLICA_LAG_CHECK_INTERVAL: float = 5.0  # Период проверки отставания, секунды
 
     # Настройки Redis
     REDIS_HOST: str = "localhost"
     REDIS_PORT: str = "6379"
     REDIS_DB: str = "0"
     REDIS_URL: Optional[str] = None
+    CAMPAIGN_STATS_TTL: int = 7 * 24 * 3600  # Время жизни счетчиков кампании, секунды
+    SSE_HEARTBEAT_INTERVAL: float = 15.0  # Интервал keep-alive в потоке событий, секунды
+
+    # Настройки кэша чтения
+    CACHE_TTL: int = 3600  # Время жизни записей в Redis, секунды
+    CACHE_LOCAL_TTL: float = 5.0  # Время жизни записей в памяти процесса, секунды
+    CACHE_LOCAL_SIZE: int = 10_000  # Максимум записей в памяти процесса
 
     # Настройки Celery
     CELERY_BROKER_URL: Optional[str] = None
@@ -31,6 +56,73 @@ class Settings(BaseSettings):
 
     # Настройки Telegram
     TELEGRAM_BOT_TOKEN: Optional[str] = None
+    TELEGRAM_API_URL: str = "https://api.telegram.org"
+    TELEGRAM_CONNECTOR_LIMIT: int = 100  # Максимум соединений в пуле
+    TELEGRAM_DNS_CACHE_TTL: int = 300  # Секунды
+    TELEGRAM_KEEPALIVE_TIMEOUT: float = 30.0  # Секунды
+    TELEGRAM_TIMEOUT: float = 10.0  # Общий таймаут запроса, секунды
+    TELEGRAM_CONNECT_TIMEOUT: float = 5.0  # Таймаут соединения, секунды
+    TELEGRAM_RATE_LIMIT_ENABLED: bool = True
+    TELEGRAM_GLOBAL_RATE: float = 30.0  # Сообщений в секунду на бота
+    TELEGRAM_GLOBAL_BURST: int = 30
+    TELEGRAM_CHAT_RATE: float = 1.0  # Сообщений в секунду на чат
+    TELEGRAM_CHAT_BURST: int = 1
+    TELEGRAM_MAX_RATE_LIMIT_RETRIES: int = 5  # Повторы после ответа 429
+
+    # Настройки email (без SMTP_HOST отправка email имитируется)
+    SMTP_HOST: Optional[str] = None
+    SMTP_PORT: int = 587
+    SMTP_USERNAME: Optional[str] = None
+    SMTP_PASSWORD: Optional[str] = None
+    SMTP_USE_TLS: bool = False  # Неявный TLS (обычно порт 465)
+    SMTP_START_TLS: Optional[bool] = None  # None - STARTTLS, если сервер поддерживает
+    SMTP_TIMEOUT: float = 30.0  # Секунды
+    SMTP_POOL_SIZE: int = 10  # Максимум одновременных SMTP соединений
+    SMTP_MAX_MESSAGES_PER_CONNECTION: int = 1000  # После этого соединение переоткрывается
+    SMTP_IDLE_CHECK_AFTER: float = 5.0  # Простаивающее дольше соединение проверяется NOOP
+    SMTP_FROM: str = "noreply@example.com"
+    EMAIL_SUBJECT: str = "Уведомление"
+
+    # Настройки доставки уведомлений
+    CAMPAIGN_MAX_USER_IDS: int = 100_000  # Максимум явно перечисленных получателей
+    CAMPAIGN_CHUNK_SIZE: int = 1000  # Получателей в одной задаче-чанке
+    CHUNK_MAX_RETRIES: int = 5  # Перезапусков упавшей задачи-чанка
+    RECIPIENT_BATCH_SIZE: int = 500  # Максимум получателей в одном захвате (не больше очереди доставки)
+    RECIPIENT_LEASE_SECONDS: int = 300  # Время аренды захваченных получателей
+    LAST_ERROR_MAX_LENGTH: int = 500  # Длина сохраняемого текста ошибки
+    DELIVERY_CONCURRENCY: int = 100  # Одновременно обрабатываемые получатели
+    EMAIL_CONCURRENCY: int = 50  # Одновременные отправки email
+    TELEGRAM_CONCURRENCY: int = 30  # Одновременные отправки в Telegram
+    STATUS_FLUSH_SIZE: int = 500  # Размер пакета записи статусов
+    STATUS_FLUSH_INTERVAL: float = 1.0  # Максимальная задержка записи, секунды
+
+    # Настройки повторов при временных ошибках
+    RETRY_MAX_ATTEMPTS: int = 5  # После этого получатель попадает в dead-letter
+    RETRY_SWEEP_INTERVAL: float = 5.0  # Период проверки очереди повторов, секунды
+    RETRY_SWEEP_BATCH: int = 1000  # Получателей за одну проверку
+    RETRY_LEASE_GRACE: float = 5.0  # Допуск расхождения часов воркеров и БД, секунды
+    # Период поиска получателей, оставшихся PENDING с истекшей арендой
+    # (потерянные повторы, упавшие воркеры), секунды
+    STALLED_SWEEP_INTERVAL: float = 60.0
+
+    # Архивация завершенных кампаний
+    ARCHIVE_AFTER_DAYS: int = 30  # Архивировать кампании, завершенные раньше
+    ARCHIVE_DIR: str = "archive"  # Каталог файлов с результатами по получателям
+    ARCHIVE_INTERVAL: float = 3600.0  # Период запуска архивации, секунды
+    ARCHIVE_CAMPAIGNS_PER_RUN: int = 100  # Кампаний за один запуск
+    ARCHIVE_DELETE_BATCH_SIZE: int = 10_000  # Строк в одном DELETE
+
+    # Настройки мониторинга
+    WORKER_METRICS_PORT: Optional[int] = 9100  # Порт метрик первого процесса воркера
+    LOG_SAMPLE_RATE: float = 0.01  # Доля записываемых в лог событий отправки
+
+    # Настройки API
+    DEFAULT_PAGE_SIZE: int = 100
+    MAX_PAGE_SIZE: int = 1000
+    STREAM_BATCH_SIZE: int = 1000  # Строк за одно чтение при потоковой выдаче
+    BULK_IMPORT_BATCH_SIZE: int = 5000  # Строк в одном INSERT при импорте
+    BULK_IMPORT_MAX_ERRORS: int = 1000  # Максимум ошибок в ответе импорта
+    BULK_IMPORT_MAX_RECORD_LINES: int = 100  # Максимум строк в одной записи CSV
 
     # Настройки безопасности
     SECRET_KEY: str = "your-secret-key-here"
@@ -47,6 +139,12 @@ class Settings(BaseSettings):
             f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}"
             f"@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
         )
+        if self.REPLICA_POSTGRES_HOST:
+            self.REPLICA_DATABASE_URL = (
+                f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}"
+                f"@{self.REPLICA_POSTGRES_HOST}:{self.REPLICA_POSTGRES_PORT or self.POSTGRES_PORT}"
+                f"/{self.POSTGRES_DB}"
+            )
         self.REDIS_URL = f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB}"
         self.CELERY_BROKER_URL = self.REDIS_URL
         self.CELERY_RESULT_BACKEND = self.REDIS_URL
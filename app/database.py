@@ -1,20 +1,124 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import asyncio
+import logging
+import time
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker
 from .config import settings
+from .metrics import instrument_engine
 
-# ✅ Улучшение: echo только в режиме отладки
-engine = create_async_engine(settings.DATABASE_URL, echo=settings.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+def _create_engine(
+    url: str,
+    pool_size: int,
+    max_overflow: int,
+    pool_timeout: float,
+    command_timeout: Optional[float],
+) -> AsyncEngine:
+    # ✅ Улучшение: echo только в режиме отладки
+    engine = create_async_engine(
+        url,
+        echo=settings.DEBUG,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args={"command_timeout": command_timeout},
+    )
+    instrument_engine(engine.sync_engine)
+    return engine
+
+
+engine = _create_engine(
+    settings.DATABASE_URL,
+    settings.DB_POOL_SIZE,
+    settings.DB_MAX_OVERFLOW,
+    settings.DB_POOL_TIMEOUT,
+    settings.DB_COMMAND_TIMEOUT,
+)
 async_session = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# Реплика для чтения; без нее чтение идет в основную базу
+replica_engine: Optional[AsyncEngine] = None
+if settings.REPLICA_DATABASE_URL:
+    replica_engine = _create_engine(
+        settings.REPLICA_DATABASE_URL,
+        settings.REPLICA_POOL_SIZE,
+        settings.REPLICA_MAX_OVERFLOW,
+        settings.REPLICA_POOL_TIMEOUT,
+        settings.REPLICA_COMMAND_TIMEOUT,
+    )
+async_read_session = sessionmaker(
+    replica_engine or engine, class_=AsyncSession, expire_on_commit=False
+)
+
 Base = declarative_base()
 
+# Отставание реплики в секундах; 0, если все полученные изменения применены
+# (простаивающая основная база не считается отставанием)
+REPLICA_LAG = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+_replica_checked_at = 0.0
+_replica_usable = False
+_replica_lock: Optional[asyncio.Lock] = None
+
+
+async def _check_replica() -> bool:
+    try:
+        async with replica_engine.connect() as conn:
+            lag = float(await conn.scalar(REPLICA_LAG))
+    except Exception as e:
+        logger.warning(f"Реплика недоступна, чтение идет в основную базу: {str(e)}")
+        return False
+    if lag > settings.REPLICA_MAX_LAG:
+        logger.warning(f"Реплика отстает на {lag:.1f} с, чтение идет в основную базу")
+        return False
+    return True
+
+
+async def replica_usable() -> bool:
+    """Можно ли читать с реплики: она настроена, доступна и отстает не больше REPLICA_MAX_LAG"""
+    global _replica_checked_at, _replica_usable, _replica_lock
+    if replica_engine is None:
+        return False
+    if time.monotonic() - _replica_checked_at < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return _replica_usable
+    if _replica_lock is None:
+        _replica_lock = asyncio.Lock()
+    async with _replica_lock:
+        # Проверку мог выполнить параллельный запрос, пока мы ждали
+        if time.monotonic() - _replica_checked_at >= settings.REPLICA_LAG_CHECK_INTERVAL:
+            _replica_usable = await _check_replica()
+            _replica_checked_at = time.monotonic()
+    return _replica_usable
+
+
 async def get_session() -> AsyncSession:
     async with async_session() as session:
         yield session
 
-async def create_tables():
-    """Создание всех таблиц в базе данных"""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+
+async def get_read_session() -> AsyncSession:
+    """Сессия только для чтения: реплика, если она не отстает, иначе основная база"""
+    maker = async_read_session if await replica_usable() else async_session
+    async with maker() as session:
+        yield session
+
+
+async def dispose_engines():
+    """Закрытие пулов соединений основной базы и реплики"""
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
@@ -1,17 +1,18 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from .api import users, campaigns
+from .api import users, campaigns, metrics
 from .config import settings
-from .database import create_tables
+from .database import dispose_engines
+from .redis_client import close_redis
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    await create_tables()
+    # Схема базы данных создается миграциями (alembic upgrade head)
     yield
     # Shutdown
-    pass
+    await close_redis()
+    await dispose_engines()
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -33,6 +34,7 @@ app.add_middleware(
 # Подключаем роутеры
 app.include_router(users.router, prefix="/users", tags=["users"])
 app.include_router(campaigns.router, prefix="/campaigns", tags=["campaigns"])
+app.include_router(metrics.router, tags=["metrics"])
 
 @app.get("/")
 async def root():
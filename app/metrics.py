@@ -0,0 +1,102 @@
+import logging
+import random
+import time
+from typing import Optional
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .config import settings
+
+# Время отправки одного сообщения по каналу
+SEND_LATENCY = Histogram(
+    "notification_send_seconds",
+    "Notification send latency by channel",
+    ["channel"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+SEND_RESULTS = Counter(
+    "notification_send_total",
+    "Notification send attempts by channel and result",
+    ["channel", "result"],
+)
+TELEGRAM_THROTTLE_WAIT = Histogram(
+    "telegram_throttle_wait_seconds",
+    "Time spent waiting for the Telegram rate limiter before a request",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+TELEGRAM_RATE_LIMITED = Counter(
+    "telegram_rate_limited_total",
+    "Telegram API responses with status 429",
+)
+
+# Обработанные получатели кампаний: rate() дает получателей в секунду.
+# Без метки кампании: прогресс отдельной кампании есть в счетчиках Redis
+CAMPAIGN_RECIPIENTS = Counter(
+    "campaign_recipients_processed_total",
+    "Campaign recipients processed by final or retry status",
+    ["status"],
+)
+
+QUEUE_DEPTH = Gauge(
+    "notification_queue_depth",
+    "Pending messages in Celery queues and the retry queue",
+    ["queue"],
+)
+
+DB_QUERY_LATENCY = Histogram(
+    "db_query_seconds",
+    "Database statement execution time by statement type",
+    ["statement"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+
+def _statement_type(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else "UNKNOWN"
+
+
+def instrument_engine(engine: Engine):
+    """Замер времени выполнения запросов через события движка SQLAlchemy"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        DB_QUERY_LATENCY.labels(_statement_type(statement)).observe(
+            time.perf_counter() - started
+        )
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        # Запрос завершился ошибкой: after_cursor_execute не будет вызван
+        starts = context.connection.info.get("query_start") if context.connection else None
+        if starts:
+            starts.pop()
+
+
+def start_worker_exporter(process_index: Optional[int] = None):
+    """
+    HTTP сервер метрик процесса воркера
+
+    Каждый процесс пула слушает свой порт: WORKER_METRICS_PORT + индекс процесса.
+    """
+    if not settings.WORKER_METRICS_PORT:
+        return
+    start_http_server(settings.WORKER_METRICS_PORT + (process_index or 0))
+
+
+def log_sampled(logger: logging.Logger, level: int, message: str, **fields):
+    """
+    Запись события в лог с вероятностью LOG_SAMPLE_RATE
+
+    Поля добавляются к сообщению в формате key=value.
+    """
+    if random.random() >= settings.LOG_SAMPLE_RATE:
+        return
+    if fields:
+        message = f"{message} " + " ".join(f"{key}={value}" for key, value in fields.items())
+    logger.log(level, message)
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Index
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -8,6 +9,12 @@ class NotificationStatus(enum.Enum):
     PENDING = "pending"  # Ожидает отправки
     SENT = "sent"       # Отправлено
     FAILED = "failed"   # Ошибка отправки
+    DEAD_LETTER = "dead_letter"  # Исчерпаны повторы после временных ошибок
+
+class CampaignPriority(enum.Enum):
+    HIGH = "high"  # Срочные транзакционные уведомления
+    NORMAL = "normal"  # Обычные рассылки
+    BULK = "bulk"  # Массовые рассылки, уступают остальным
 
 class User(Base):
     __tablename__ = "users"
@@ -15,7 +22,7 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True, nullable=False)
     telegram_id = Column(String, nullable=True)  # Опциональный Telegram ID
-    created_at = Column(DateTime, default=datetime.utcnow)  # Время создания
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # Время создания
 
     campaigns = relationship("CampaignUser", back_populates="user")
 
@@ -24,18 +31,56 @@ class Campaign(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     text = Column(String, nullable=False)  # Текст уведомления
+    priority = Column(
+        Enum(CampaignPriority),
+        nullable=False,
+        default=CampaignPriority.NORMAL,
+        server_default=CampaignPriority.NORMAL.name,
+    )  # Класс приоритета, определяет очередь задач
     created_at = Column(DateTime, default=datetime.utcnow)  # Время создания
+    started_at = Column(DateTime, nullable=True)  # Время начала рассылки
+    completed_at = Column(DateTime, nullable=True, index=True)  # Время завершения рассылки
+    archived_at = Column(DateTime, nullable=True)  # Время переноса получателей в архив
 
     users = relationship("CampaignUser", back_populates="campaign")
 
 class CampaignUser(Base):
     __tablename__ = "campaign_users"
+    __table_args__ = (
+        # Подсчет статусов, выборка получателей с фильтром по статусу
+        # и захват неотправленных получателей
+        Index("ix_campaign_users_campaign_status_user", "campaign_id", "status", "user_id"),
+        # Секции по диапазонам campaign_id (см. services/partitions.py),
+        # схема создается миграциями
+        {"postgresql_partition_by": "RANGE (campaign_id)"},
+    )
 
     campaign_id = Column(Integer, ForeignKey("campaigns.id"), primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
     status = Column(Enum(NotificationStatus), default=NotificationStatus.PENDING)  # Статус отправки
     created_at = Column(DateTime, default=datetime.utcnow)  # Время создания
     sent_at = Column(DateTime, nullable=True)  # Время отправки
+    lease_expires_at = Column(DateTime, nullable=True)  # Получатель захвачен воркером до этого времени
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")  # Сделано попыток отправки
+    last_error = Column(String, nullable=True)  # Последняя ошибка отправки
+    # Каналы, по которым уведомление уже доставлено: повтор их пропускает
+    delivered_channels = Column(
+        ARRAY(String), nullable=False, default=list, server_default="{}"
+    )
 
     campaign = relationship("Campaign", back_populates="users")
-    user = relationship("User", back_populates="campaigns")
\ No newline at end of file
+    user = relationship("User", back_populates="campaigns")
+
+class CampaignArchive(Base):
+    """Итоги завершенной кампании, получатели которой перенесены в архив"""
+    __tablename__ = "campaign_archives"
+
+    campaign_id = Column(Integer, ForeignKey("campaigns.id"), primary_key=True)
+    total = Column(Integer, nullable=False)
+    sent = Column(Integer, nullable=False)
+    failed = Column(Integer, nullable=False)
+    dead_letter = Column(Integer, nullable=False)
+    first_sent_at = Column(DateTime, nullable=True)  # Первая успешная отправка
+    last_sent_at = Column(DateTime, nullable=True)  # Последняя успешная отправка
+    export_path = Column(String, nullable=False)  # Файл с результатами по получателям
+    archived_at = Column(DateTime, default=datetime.utcnow)  # Время архивации
@@ -0,0 +1,27 @@
+import asyncio
+from typing import Optional
+import redis.asyncio as redis
+from .config import settings
+
+_client: Optional[redis.Redis] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_redis() -> redis.Redis:
+    """Асинхронный клиент Redis для текущего процесса"""
+    global _client, _loop
+    loop = asyncio.get_running_loop()
+    # Пул соединений привязан к циклу событий, в котором был создан
+    if _client is None or _loop is not loop:
+        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        _loop = loop
+    return _client
+
+
+async def close_redis():
+    """Закрытие клиента Redis текущего процесса"""
+    global _client, _loop
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _loop = None
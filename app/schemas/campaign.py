@@ -1,20 +1,31 @@
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, validator, model_validator
 from typing import List, Optional
 from datetime import datetime
 from .user import User
-from ..models.models import NotificationStatus
+from ..config import settings
+from ..models.models import NotificationStatus, CampaignPriority
 
 class CampaignUserStatus(BaseModel):
     user: User
     status: NotificationStatus  # ✅ Исправлено: используем enum вместо str
     sent_at: Optional[datetime] = None
+    attempts: int = 0
+    last_error: Optional[str] = None
 
     class Config:
         from_attributes = True
 
+class CampaignAudience(BaseModel):
+    """Фильтр аудитории кампании; пустой фильтр означает всех пользователей"""
+    has_telegram: Optional[bool] = None  # Только пользователи с/без telegram_id
+    created_after: Optional[datetime] = None  # Зарегистрированные не раньше
+    created_before: Optional[datetime] = None  # Зарегистрированные раньше
+
 class CampaignCreate(BaseModel):
     text: str
-    user_ids: List[int]
+    priority: CampaignPriority = CampaignPriority.NORMAL
+    user_ids: Optional[List[int]] = None
+    audience: Optional[CampaignAudience] = None
     
     @validator('text')
     def validate_text(cls, v):
@@ -26,27 +37,46 @@ class CampaignCreate(BaseModel):
     
     @validator('user_ids')
     def validate_user_ids(cls, v):
+        if v is None:
+            return v
         if len(v) == 0:
             raise ValueError('At least one user_id required')
-        if len(v) > 1000:
-            raise ValueError('Too many users (max 1000)')
-        return v
+        if len(v) > settings.CAMPAIGN_MAX_USER_IDS:
+            raise ValueError(f'Too many users (max {settings.CAMPAIGN_MAX_USER_IDS})')
+        # Убираем повторы, сохраняя порядок
+        return list(dict.fromkeys(v))
+
+    @model_validator(mode='after')
+    def validate_recipients(self):
+        if (self.user_ids is None) == (self.audience is None):
+            raise ValueError('Exactly one of user_ids or audience is required')
+        return self
 
-class Campaign(BaseModel):
+class CampaignSummary(BaseModel):
     id: int
     text: str
+    priority: CampaignPriority = CampaignPriority.NORMAL
     created_at: datetime
-    users: List[CampaignUserStatus] = []
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    archived_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
+class CampaignCreated(CampaignSummary):
+    total_notifications: int
+
 class CampaignStatus(BaseModel):
     id: int
     status: str
     total_notifications: int
     sent_notifications: int
     failed_notifications: int
+    dead_letter_notifications: int = 0  # Входят в failed_notifications
     pending_notifications: int
     created_at: datetime
-    completed_at: Optional[datetime] = None
\ No newline at end of file
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    throughput: Optional[float] = None  # Сообщений в секунду
+    archived_at: Optional[datetime] = None  # Статус взят из итогов архива
\ No newline at end of file
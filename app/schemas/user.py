@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -18,4 +18,15 @@ class User(UserBase):
     created_at: datetime  # ✅ Исправлено: убрали Optional
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class BulkImportError(BaseModel):
+    line: int  # Номер строки во входных данных
+    error: str
+
+class BulkImportResult(BaseModel):
+    total: int = 0  # Обработано строк с данными
+    inserted: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: List[BulkImportError] = []  # Не больше BULK_IMPORT_MAX_ERRORS
\ No newline at end of file
@@ -0,0 +1,275 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+from sqlalchemy import select, delete, exists, func, or_
+from ..cache import campaign_cache
+from ..config import settings
+from ..database import async_session
+from ..models.models import Campaign, CampaignArchive, CampaignUser, NotificationStatus
+from ..redis_client import get_redis
+from .campaign_stats import drop_stats
+from .partitions import partition_bounds, partition_exists, drop_partition
+
+logger = logging.getLogger(__name__)
+
+campaign_users = CampaignUser.__table__
+
+ARCHIVE_LOCK_KEY = "campaigns:archive:lock"
+
+
+def _archive_cutoff() -> datetime:
+    """Кампании, завершенные раньше, подлежат архивации"""
+    return datetime.utcnow() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+
+
+def export_path(campaign_id: int) -> Path:
+    """Файл с результатами доставки по получателям кампании"""
+    return Path(settings.ARCHIVE_DIR) / f"campaign_{campaign_id}.ndjson.gz"
+
+
+async def _export_recipients(campaign_id: int) -> Path:
+    """
+    Выгрузка результатов по получателям в NDJSON со сжатием gzip
+
+    Строки читаются серверным курсором и пишутся пакетами, файл
+    появляется под итоговым именем только после полной записи.
+    """
+    path = export_path(campaign_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    stmt = (
+        select(
+            CampaignUser.user_id,
+            CampaignUser.status,
+            CampaignUser.sent_at,
+            CampaignUser.attempts,
+            CampaignUser.last_error,
+        )
+        .where(CampaignUser.campaign_id == campaign_id)
+        .order_by(CampaignUser.user_id)
+        .execution_options(yield_per=settings.STREAM_BATCH_SIZE)
+    )
+    async with async_session() as session:
+        result = await session.stream(stmt)
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as out:
+            async for rows in result.partitions():
+                lines = [
+                    json.dumps({
+                        "user_id": row.user_id,
+                        "status": row.status.value if row.status else None,
+                        "sent_at": row.sent_at.isoformat() if row.sent_at else None,
+                        "attempts": row.attempts,
+                        "last_error": row.last_error,
+                    }, ensure_ascii=False) + "\n"
+                    for row in rows
+                ]
+                await asyncio.to_thread(out.writelines, lines)
+    os.replace(tmp_path, path)
+    return path
+
+
+async def _summarize(session, campaign_id: int) -> dict:
+    """Итоги кампании одним агрегирующим запросом"""
+    status = CampaignUser.status
+    row = (await session.execute(
+        select(
+            func.count(),
+            func.count().filter(status == NotificationStatus.SENT),
+            func.count().filter(status == NotificationStatus.FAILED),
+            func.count().filter(status == NotificationStatus.DEAD_LETTER),
+            func.min(CampaignUser.sent_at),
+            func.max(CampaignUser.sent_at),
+        ).where(CampaignUser.campaign_id == campaign_id)
+    )).one()
+    return {
+        "total": row[0],
+        "sent": row[1],
+        "failed": row[2],
+        "dead_letter": row[3],
+        "first_sent_at": row[4],
+        "last_sent_at": row[5],
+    }
+
+
+async def _partition_archived(start: int, end: int, pending: bool = False) -> bool:
+    """
+    Все кампании диапазона в архиве, и новых в нем уже не будет
+
+    С `pending` достаточно, чтобы остальные кампании диапазона
+    подлежали архивации: секция будет удалена после последней из них.
+    """
+    async with async_session() as session:
+        max_id = await session.scalar(select(func.max(Campaign.id)))
+        if max_id is None or max_id < end - 1:
+            return False
+        active = Campaign.archived_at.is_(None)
+        if pending:
+            active &= or_(
+                Campaign.completed_at.is_(None), Campaign.completed_at >= _archive_cutoff()
+            )
+        not_archived = await session.scalar(
+            select(func.count()).where(Campaign.id >= start, Campaign.id < end, active)
+        )
+        return not_archived == 0
+
+
+async def _delete_recipients(campaign_id: int):
+    """Удаление строк получателей пакетами, каждый в своей транзакции"""
+    batch_size = settings.ARCHIVE_DELETE_BATCH_SIZE
+    batch = (
+        select(campaign_users.c.user_id)
+        .where(campaign_users.c.campaign_id == campaign_id)
+        .limit(batch_size)
+        .scalar_subquery()
+    )
+    stmt = delete(campaign_users).where(
+        campaign_users.c.campaign_id == campaign_id,
+        campaign_users.c.user_id.in_(batch),
+    )
+    while True:
+        async with async_session() as session:
+            result = await session.execute(stmt)
+            await session.commit()
+        if result.rowcount < batch_size:
+            return
+
+
+async def _remove_recipients(campaign_id: int) -> bool:
+    """
+    Удаление строк получателей кампании в архиве
+
+    Если в архив уйдет вся секция кампании, строки не удаляются:
+    секция отсоединяется и удаляется целиком после последней кампании.
+    DELETE выполняется только для секции по умолчанию и секций,
+    в которых остаются активные кампании.
+
+    Returns:
+        True, если решение принято для всей секции (удалена или ждет удаления)
+    """
+    start, end = partition_bounds(campaign_id)
+    async with async_session() as session:
+        if not await partition_exists(session, campaign_id):
+            await _delete_recipients(campaign_id)
+            return False
+    if await _partition_archived(start, end):
+        try:
+            await drop_partition(start)
+        except Exception as e:
+            # Строки остаются до следующего запуска архивации
+            logger.warning(f"Не удалось удалить секцию кампаний [{start}, {end}): {str(e)}")
+        return True
+    if await _partition_archived(start, end, pending=True):
+        return True
+    await _delete_recipients(campaign_id)
+    return False
+
+
+async def archive_campaign(campaign_id: int) -> bool:
+    """
+    Архивация завершенной кампании
+
+    Результаты по получателям выгружаются в файл, итоги сохраняются
+    в campaign_archives, после чего строки получателей удаляются
+    (см. _remove_recipients). Повторный вызов для уже заархивированной
+    кампании только доудаляет оставшиеся строки.
+
+    Returns:
+        False, если кампания не найдена или еще не завершена
+    """
+    async with async_session() as session:
+        campaign = await session.get(Campaign, campaign_id)
+        if campaign is None or campaign.completed_at is None:
+            return False
+
+        if campaign.archived_at is None:
+            path = await _export_recipients(campaign_id)
+            summary = await _summarize(session, campaign_id)
+            session.add(CampaignArchive(
+                campaign_id=campaign_id, export_path=str(path), **summary
+            ))
+            campaign.archived_at = datetime.utcnow()
+            await session.commit()
+            await campaign_cache.invalidate(campaign_id)
+            try:
+                await drop_stats(campaign_id)
+            except Exception as e:
+                logger.warning(f"Не удалось удалить счетчики кампании {campaign_id}: {str(e)}")
+            logger.info(
+                f"Кампания {campaign_id} перенесена в архив: {summary['total']} получателей, "
+                f"файл {path}"
+            )
+
+    await _remove_recipients(campaign_id)
+    return True
+
+
+async def _campaigns_to_archive(limit: int) -> List[int]:
+    async with async_session() as session:
+        result = await session.scalars(
+            select(Campaign.id)
+            .where(Campaign.completed_at < _archive_cutoff(), Campaign.archived_at.is_(None))
+            .order_by(Campaign.id)
+            .limit(limit)
+        )
+        return list(result)
+
+
+async def _remove_leftovers():
+    """
+    Строки кампаний в архиве: после прерванного запуска или
+    в ожидании удаления секции
+
+    Для каждой секции решение принимается один раз за запуск.
+    """
+    has_recipients = exists().where(CampaignUser.campaign_id == Campaign.id)
+    async with async_session() as session:
+        campaign_ids = list(await session.scalars(
+            select(Campaign.id)
+            .where(Campaign.archived_at.is_not(None), has_recipients)
+            .order_by(Campaign.id)
+        ))
+    handled = set()
+    for campaign_id in campaign_ids:
+        start, _ = partition_bounds(campaign_id)
+        if start in handled:
+            continue
+        try:
+            if await _remove_recipients(campaign_id):
+                handled.add(start)
+        except Exception as e:
+            logger.error(f"Ошибка удаления строк кампании {campaign_id}: {str(e)}")
+
+
+async def archive_finished_campaigns(limit: Optional[int] = None) -> int:
+    """
+    Архивация кампаний, завершенных больше ARCHIVE_AFTER_DAYS дней назад
+
+    Одновременно выполняется только один запуск (блокировка в Redis).
+
+    Returns:
+        Количество обработанных кампаний
+    """
+    lock = get_redis().lock(ARCHIVE_LOCK_KEY, timeout=settings.ARCHIVE_INTERVAL)
+    if not await lock.acquire(blocking=False):
+        logger.info("Архивация уже выполняется другим процессом")
+        return 0
+    try:
+        archived = 0
+        for campaign_id in await _campaigns_to_archive(limit or settings.ARCHIVE_CAMPAIGNS_PER_RUN):
+            try:
+                if await archive_campaign(campaign_id):
+                    archived += 1
+            except Exception as e:
+                logger.error(f"Ошибка архивации кампании {campaign_id}: {str(e)}")
+        await _remove_leftovers()
+        return archived
+    finally:
+        try:
+            await lock.release()
+        except Exception:
+            pass
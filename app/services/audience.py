@@ -0,0 +1,69 @@
+from datetime import datetime
+from typing import List
+from sqlalchemy import select, insert, literal, any_, bindparam, Integer, DateTime
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.models import CampaignUser, User, NotificationStatus
+from ..schemas.campaign import CampaignCreate, CampaignAudience
+
+
+class UsersNotFoundError(Exception):
+    """В списке получателей есть несуществующие пользователи"""
+
+    def __init__(self, user_ids: List[int]):
+        super().__init__(f"Users not found: {user_ids}")
+        self.user_ids = user_ids
+
+
+def _audience_users(audience: CampaignAudience):
+    stmt = select(User.id)
+    if audience.has_telegram is True:
+        stmt = stmt.where(User.telegram_id.is_not(None))
+    elif audience.has_telegram is False:
+        stmt = stmt.where(User.telegram_id.is_(None))
+    if audience.created_after is not None:
+        stmt = stmt.where(User.created_at >= audience.created_after)
+    if audience.created_before is not None:
+        stmt = stmt.where(User.created_at < audience.created_before)
+    return stmt
+
+
+async def materialize_recipients(
+    session: AsyncSession,
+    campaign_id: int,
+    campaign: CampaignCreate,
+) -> int:
+    """
+    Заполнение получателей кампании одним INSERT ... SELECT на стороне базы
+
+    Получатели выбираются либо по явному списку ID (users.id = ANY(:ids)),
+    либо по фильтру аудитории. Транзакцию фиксирует вызывающий код.
+
+    Returns:
+        Количество добавленных получателей
+
+    Raises:
+        UsersNotFoundError: Если часть явно указанных пользователей не найдена
+    """
+    if campaign.user_ids is not None:
+        user_ids = bindparam("user_ids", campaign.user_ids, type_=ARRAY(Integer))
+        users = select(User.id).where(User.id == any_(user_ids))
+    else:
+        users = _audience_users(campaign.audience)
+
+    rows = users.add_columns(
+        literal(campaign_id, Integer).label("campaign_id"),
+        literal(NotificationStatus.PENDING, CampaignUser.status.type).label("status"),
+        literal(datetime.utcnow(), DateTime).label("created_at"),
+    )
+    stmt = insert(CampaignUser).from_select(
+        ["user_id", "campaign_id", "status", "created_at"], rows
+    )
+    result = await session.execute(stmt)
+
+    if campaign.user_ids is not None and result.rowcount != len(campaign.user_ids):
+        found = set((await session.scalars(users)).all())
+        raise UsersNotFoundError([
+            user_id for user_id in campaign.user_ids if user_id not in found
+        ])
+    return result.rowcount
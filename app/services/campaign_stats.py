@@ -0,0 +1,177 @@
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from ..models.models import CampaignUser, CampaignArchive, NotificationStatus
+from ..redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CampaignStats:
+    """Счетчики статусов уведомлений кампании"""
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    dead_letter: int = 0  # Исчерпаны повторы после временных ошибок
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed + self.dead_letter
+
+    @property
+    def pending(self) -> int:
+        return max(0, self.total - self.processed)
+
+    def rate(
+        self,
+        started_at: Optional[datetime],
+        completed_at: Optional[datetime] = None,
+    ) -> Optional[float]:
+        """Средняя скорость обработки (сообщений в секунду) с начала рассылки"""
+        if not started_at or not self.processed:
+            return None
+        elapsed = ((completed_at or datetime.utcnow()) - started_at).total_seconds()
+        if elapsed <= 0:
+            return None
+        return round(self.processed / elapsed, 2)
+
+
+def _stats_key(campaign_id: int) -> str:
+    return f"campaign:{campaign_id}:stats"
+
+
+def events_channel(campaign_id: int) -> str:
+    """Канал Redis pub/sub с событиями прогресса кампании"""
+    return f"campaign:{campaign_id}:events"
+
+
+async def init_stats(campaign_id: int, stats: CampaignStats):
+    """
+    Создание счетчиков кампании в Redis, если их еще нет
+
+    Счетчики заполняются подсчетом по базе данных (см. count_stats), поэтому
+    возобновленная кампания не теряет уже обработанных получателей.
+    Существующие значения не перезаписываются.
+    """
+    key = _stats_key(campaign_id)
+    async with get_redis().pipeline(transaction=True) as pipe:
+        pipe.hsetnx(key, "total", stats.total)
+        pipe.hsetnx(key, "sent", stats.sent)
+        pipe.hsetnx(key, "failed", stats.failed)
+        pipe.hsetnx(key, "dead_letter", stats.dead_letter)
+        pipe.expire(key, settings.CAMPAIGN_STATS_TTL)
+        await pipe.execute()
+
+
+async def incr_stats(
+    campaign_id: int,
+    sent: int = 0,
+    failed: int = 0,
+    dead_letter: int = 0,
+) -> Optional[CampaignStats]:
+    """
+    Атомарное увеличение счетчиков кампании
+
+    Returns:
+        Значения счетчиков после увеличения или None, если счетчики
+        кампании не инициализированы
+    """
+    key = _stats_key(campaign_id)
+    async with get_redis().pipeline(transaction=True) as pipe:
+        pipe.hincrby(key, "sent", sent)
+        pipe.hincrby(key, "failed", failed)
+        pipe.hincrby(key, "dead_letter", dead_letter)
+        pipe.hget(key, "total")
+        pipe.expire(key, settings.CAMPAIGN_STATS_TTL)
+        new_sent, new_failed, new_dead_letter, total, _ = await pipe.execute()
+    if total is None:
+        return None
+    return CampaignStats(
+        total=int(total), sent=new_sent, failed=new_failed, dead_letter=new_dead_letter
+    )
+
+
+async def publish_progress(campaign_id: int, stats: CampaignStats, sent: int, failed: int):
+    """Публикация прогресса кампании: текущие счетчики и прирост с прошлого события"""
+    event = {
+        "type": "progress",
+        "total": stats.total,
+        "sent": stats.sent,
+        "failed": stats.failed,
+        "dead_letter": stats.dead_letter,
+        "delta_sent": sent,
+        "delta_failed": failed,
+    }
+    await get_redis().publish(events_channel(campaign_id), json.dumps(event))
+
+
+async def publish_completed(campaign_id: int, completed_at: datetime):
+    """Уведомление подписчиков о завершении кампании"""
+    event = {"type": "completed", "completed_at": completed_at.isoformat()}
+    await get_redis().publish(events_channel(campaign_id), json.dumps(event))
+
+
+async def drop_stats(campaign_id: int):
+    """Удаление счетчиков: дальнейшие чтения пойдут в базу данных"""
+    await get_redis().delete(_stats_key(campaign_id))
+
+
+async def get_cached_stats(campaign_id: int) -> Optional[CampaignStats]:
+    """Счетчики кампании из Redis или None, если их нет"""
+    data = await get_redis().hgetall(_stats_key(campaign_id))
+    if "total" not in data:
+        return None
+    return CampaignStats(
+        total=int(data["total"]),
+        sent=int(data.get("sent", 0)),
+        failed=int(data.get("failed", 0)),
+        dead_letter=int(data.get("dead_letter", 0)),
+    )
+
+
+async def count_stats(session: AsyncSession, campaign_id: int) -> CampaignStats:
+    """Подсчет статусов кампании одним запросом GROUP BY"""
+    stmt = (
+        select(CampaignUser.status, func.count())
+        .where(CampaignUser.campaign_id == campaign_id)
+        .group_by(CampaignUser.status)
+    )
+    result = await session.execute(stmt)
+    counts = dict(result.all())
+    return CampaignStats(
+        total=sum(counts.values()),
+        sent=counts.get(NotificationStatus.SENT, 0),
+        failed=counts.get(NotificationStatus.FAILED, 0),
+        dead_letter=counts.get(NotificationStatus.DEAD_LETTER, 0),
+    )
+
+
+async def get_stats(session: AsyncSession, campaign_id: int) -> CampaignStats:
+    """
+    Счетчики кампании из Redis с откатом на базу данных
+
+    Для кампании в архиве счетчики берутся из ее итогов.
+    """
+    try:
+        stats = await get_cached_stats(campaign_id)
+    except Exception as e:
+        logger.warning(f"Не удалось получить счетчики кампании {campaign_id} из Redis: {str(e)}")
+        stats = None
+    if stats is not None:
+        return stats
+
+    archive = await session.get(CampaignArchive, campaign_id)
+    if archive is not None:
+        return CampaignStats(
+            total=archive.total,
+            sent=archive.sent,
+            failed=archive.failed,
+            dead_letter=archive.dead_letter,
+        )
+    return await count_stats(session, campaign_id)
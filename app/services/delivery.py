@@ -0,0 +1,145 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterable, Awaitable, Callable, FrozenSet, Iterable, Optional, Set, Tuple, Union
+from ..config import settings
+from ..metrics import SEND_LATENCY, SEND_RESULTS
+
+
+@dataclass(frozen=True)
+class Recipient:
+    """Получатель уведомления"""
+    user_id: int
+    email: str
+    telegram_id: Optional[str] = None
+    attempts: int = 0  # Сделано попыток отправки
+    lease_expires_at: Optional[datetime] = None  # Аренда, с которой получатель захвачен
+    delivered_channels: Tuple[str, ...] = ()  # Каналы, доставленные прошлыми попытками
+
+
+ChannelSender = Callable[[str, str], Awaitable[object]]
+# Получатель, ошибка доставки или None и каналы, по которым уже доставлено
+ResultCallback = Callable[[Recipient, Optional[Exception], FrozenSet[str]], Awaitable[None]]
+
+
+class DeliveryEngine:
+    """
+    Параллельная отправка уведомлений с ограничением конкурентности
+
+    Получатели обрабатываются пулом из `concurrency` воркеров, при этом
+    одновременное число отправок по каждому каналу ограничено отдельно.
+    Ошибка доставки одному получателю не влияет на остальных.
+    """
+
+    def __init__(
+        self,
+        text: str,
+        email_sender: ChannelSender,
+        telegram_sender: ChannelSender,
+        concurrency: Optional[int] = None,
+        email_concurrency: Optional[int] = None,
+        telegram_concurrency: Optional[int] = None,
+    ):
+        self.text = text
+        self.email_sender = email_sender
+        self.telegram_sender = telegram_sender
+        self.concurrency = concurrency or settings.DELIVERY_CONCURRENCY
+        self._email_limit = asyncio.Semaphore(
+            email_concurrency or settings.EMAIL_CONCURRENCY
+        )
+        self._telegram_limit = asyncio.Semaphore(
+            telegram_concurrency or settings.TELEGRAM_CONCURRENCY
+        )
+
+    @property
+    def queue_size(self) -> int:
+        """Емкость очереди получателей, ожидающих свободного воркера"""
+        return self.concurrency * 2
+
+    async def deliver(self, recipient: Recipient, delivered: Optional[Set[str]] = None):
+        """
+        Отправка уведомления одному получателю по всем его каналам
+
+        Каналы из `delivered` пропускаются, успешно отправленные
+        добавляются в него: при ошибке в нем остаются доставленные.
+        """
+        if delivered is None:
+            delivered = set()
+        if "email" not in delivered:
+            async with self._email_limit:
+                await self._send("email", self.email_sender, recipient.email)
+            delivered.add("email")
+
+        if recipient.telegram_id and "telegram" not in delivered:
+            async with self._telegram_limit:
+                # Задержку Telegram пишет клиент: без ожидания лимитера
+                await self._send(
+                    "telegram", self.telegram_sender, recipient.telegram_id, timed=False
+                )
+            delivered.add("telegram")
+
+    async def _send(
+        self, channel: str, sender: ChannelSender, address: str, timed: bool = True
+    ):
+        started = time.perf_counter()
+        try:
+            await sender(address, self.text)
+        except Exception:
+            SEND_RESULTS.labels(channel, "failure").inc()
+            raise
+        else:
+            SEND_RESULTS.labels(channel, "success").inc()
+        finally:
+            if timed:
+                SEND_LATENCY.labels(channel).observe(time.perf_counter() - started)
+
+    async def run(
+        self,
+        recipients: Union[Iterable[Recipient], AsyncIterable[Recipient]],
+        on_result: ResultCallback,
+    ):
+        """
+        Отправка уведомлений всем получателям
+
+        Args:
+            recipients: Получатели (обычный или асинхронный итератор)
+            on_result: Колбэк, вызываемый после обработки каждого получателя
+                с ошибкой доставки или None при успехе и доставленными каналами
+        """
+        # Очередь ограничена, чтобы не держать в памяти всех получателей сразу
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        async def worker():
+            while True:
+                recipient = await queue.get()
+                try:
+                    if recipient is None:
+                        return
+                    delivered = set(recipient.delivered_channels)
+                    try:
+                        await self.deliver(recipient, delivered)
+                    except Exception as e:
+                        await on_result(recipient, e, frozenset(delivered))
+                    else:
+                        await on_result(recipient, None, frozenset(delivered))
+                finally:
+                    queue.task_done()
+
+        async def produce():
+            if hasattr(recipients, "__aiter__"):
+                async for recipient in recipients:
+                    await queue.put(recipient)
+            else:
+                for recipient in recipients:
+                    await queue.put(recipient)
+            for _ in range(self.concurrency):
+                await queue.put(None)
+
+        tasks = [asyncio.create_task(produce())]
+        tasks += [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,184 @@
+from email.message import EmailMessage
+from typing import Optional
+from ..config import settings
+import asyncio
+import logging
+import time
+import aiosmtplib
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых соединение считается потерянным
+DISCONNECT_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    aiosmtplib.SMTPTimeoutError,
+    ConnectionError,
+)
+
+
+class SMTPPool:
+    """
+    Пул постоянных SMTP соединений с авторизацией
+
+    Соединения открываются по требованию (не больше `size` одновременно)
+    и переиспользуются между письмами, так что отправка одного письма
+    стоит одной SMTP транзакции. Соединение, простаивавшее дольше
+    SMTP_IDLE_CHECK_AFTER, перед отправкой проверяется командой NOOP и
+    при разрыве открывается заново. Письмо не отправляется повторно:
+    ошибка во время отправки уходит в обычные повторы получателя.
+    """
+
+    def __init__(
+        self,
+        hostname: Optional[str] = None,
+        port: Optional[int] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        size: Optional[int] = None,
+    ):
+        self.hostname = hostname or settings.SMTP_HOST
+        self.port = port or settings.SMTP_PORT
+        self.username = username or settings.SMTP_USERNAME
+        self.password = password or settings.SMTP_PASSWORD
+        self.size = size or settings.SMTP_POOL_SIZE
+        self._idle: asyncio.LifoQueue = asyncio.LifoQueue()
+        self._slots = asyncio.Semaphore(self.size)
+        self._loop = asyncio.get_running_loop()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Цикл событий, к которому привязаны соединения"""
+        return self._loop
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            timeout=settings.SMTP_TIMEOUT,
+            use_tls=settings.SMTP_USE_TLS,
+            start_tls=settings.SMTP_START_TLS,
+        )
+        await smtp.connect()
+        if self.username:
+            try:
+                await smtp.login(self.username, self.password or "")
+            except BaseException:
+                smtp.close()
+                raise
+        smtp.messages_sent = 0
+        return smtp
+
+    @staticmethod
+    async def _is_alive(smtp: aiosmtplib.SMTP) -> bool:
+        if not smtp.is_connected:
+            return False
+        if time.monotonic() - smtp.idle_since < settings.SMTP_IDLE_CHECK_AFTER:
+            return True
+        # Сервер мог закрыть простаивающее соединение
+        try:
+            await smtp.noop()
+        except (aiosmtplib.SMTPException, ConnectionError):
+            smtp.close()
+            return False
+        return True
+
+    async def _acquire(self) -> aiosmtplib.SMTP:
+        await self._slots.acquire()
+        try:
+            while not self._idle.empty():
+                smtp = self._idle.get_nowait()
+                if await self._is_alive(smtp):
+                    return smtp
+            return await self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def _release(self, smtp: Optional[aiosmtplib.SMTP]):
+        try:
+            if smtp is None:
+                return
+            if (
+                smtp.is_connected
+                and smtp.messages_sent < settings.SMTP_MAX_MESSAGES_PER_CONNECTION
+            ):
+                smtp.idle_since = time.monotonic()
+                self._idle.put_nowait(smtp)
+            else:
+                await self._quit(smtp)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    async def _quit(smtp: aiosmtplib.SMTP):
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    async def send(self, message: EmailMessage):
+        """Отправка письма через свободное соединение пула"""
+        smtp = await self._acquire()
+        try:
+            try:
+                await smtp.send_message(message)
+            except DISCONNECT_ERRORS:
+                # Письмо могло быть принято сервером: без повторной отправки,
+                # соединение в неизвестном состоянии не возвращается в пул
+                smtp.close()
+                raise
+            smtp.messages_sent += 1
+        finally:
+            await self._release(smtp)
+
+    async def close(self):
+        """Закрытие всех простаивающих соединений"""
+        while not self._idle.empty():
+            await self._quit(self._idle.get_nowait())
+
+
+_pool: Optional[SMTPPool] = None
+
+
+def get_smtp_pool() -> SMTPPool:
+    """Пул SMTP соединений текущего процесса"""
+    global _pool
+    # Соединения привязаны к циклу событий, в котором были открыты
+    if _pool is None or _pool.loop is not asyncio.get_running_loop():
+        _pool = SMTPPool()
+    return _pool
+
+
+async def close_smtp_pool():
+    """Закрытие пула SMTP соединений текущего процесса"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+async def send_email(email: str, text: str):
+    """
+    Отправка email через пул SMTP соединений
+
+    Args:
+        email: Адрес получателя
+        text: Текст сообщения
+
+    Raises:
+        aiosmtplib.SMTPException: При ошибке отправки письма
+    """
+    message = EmailMessage()
+    message["From"] = settings.SMTP_FROM
+    message["To"] = email
+    message["Subject"] = settings.EMAIL_SUBJECT
+    message.set_content(text)
+    try:
+        await get_smtp_pool().send(message)
+    except Exception as e:
+        # Результат отправки записывает вызывающий код, здесь только отладка
+        logger.debug(f"Ошибка отправки email на {email}: {str(e)}")
+        raise
+    logger.debug(f"Email отправлен на {email}")
@@ -0,0 +1,117 @@
+import logging
+from typing import Optional, Set, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from ..database import engine
+
+logger = logging.getLogger(__name__)
+
+# Кампаний в одной секции campaign_users; совпадает с миграцией 0003,
+# менять нельзя после создания секций
+CAMPAIGN_PARTITION_SIZE = 1000
+
+# Секции, существование которых уже проверено этим процессом
+_known_partitions: Set[int] = set()
+
+
+def partition_bounds(campaign_id: int) -> Tuple[int, int]:
+    """Диапазон campaign_id [start, end) секции, в которую попадает кампания"""
+    start = campaign_id // CAMPAIGN_PARTITION_SIZE * CAMPAIGN_PARTITION_SIZE
+    return start, start + CAMPAIGN_PARTITION_SIZE
+
+
+def partition_name(start: int) -> str:
+    return f"campaign_users_p{start}"
+
+
+async def _create_partition(start: int):
+    name = partition_name(start)
+    end = start + CAMPAIGN_PARTITION_SIZE
+    async with engine.begin() as conn:
+        # Секцию создает один процесс, остальные ждут и видят готовую
+        await conn.execute(
+            text("SELECT pg_advisory_xact_lock(hashtext('campaign_users_partition'))")
+        )
+        if await conn.scalar(text("SELECT to_regclass(:name)"), {"name": name}):
+            return
+        await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        # ATTACH PARTITION блокирует родительскую таблицу слабее, чем
+        # CREATE TABLE ... PARTITION OF, а CHECK избавляет от проверки строк
+        await conn.execute(text(
+            f"CREATE TABLE {name} (LIKE campaign_users INCLUDING DEFAULTS)"
+        ))
+        await conn.execute(text(
+            f"ALTER TABLE {name} ADD CONSTRAINT {name}_bounds "
+            f"CHECK (campaign_id >= {start} AND campaign_id < {end})"
+        ))
+        await conn.execute(text(
+            f"ALTER TABLE campaign_users ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ({start}) TO ({end})"
+        ))
+        await conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {name}_bounds"))
+    logger.info(f"Создана секция {name} для кампаний [{start}, {end})")
+
+
+async def ensure_partitions_ahead(ahead: Optional[int] = None) -> int:
+    """
+    Создание секций campaign_users заранее: для последней кампании
+    и `ahead` следующих диапазонов
+
+    Выполняется периодической задачей, а не при создании кампании:
+    ATTACH PARTITION блокирует секцию по умолчанию и может ждать
+    блокировок, что недопустимо на пути запроса.
+
+    Returns:
+        Количество созданных или найденных секций
+    """
+    ahead = settings.CAMPAIGN_PARTITIONS_AHEAD if ahead is None else ahead
+    async with engine.connect() as conn:
+        last_id = await conn.scalar(text("SELECT COALESCE(MAX(id), 0) FROM campaigns"))
+    first, _ = partition_bounds(last_id)
+    ready = 0
+    for index in range(ahead + 1):
+        start = first + index * CAMPAIGN_PARTITION_SIZE
+        if start not in _known_partitions:
+            try:
+                await _create_partition(start)
+            except Exception as e:
+                # Например, строки диапазона уже попали в секцию по умолчанию
+                logger.error(f"Не удалось создать секцию {partition_name(start)}: {str(e)}")
+                continue
+            _known_partitions.add(start)
+        ready += 1
+    return ready
+
+
+async def partition_exists(session: AsyncSession, campaign_id: int) -> bool:
+    """Есть ли секция campaign_users для кампании (без DDL и блокировок)"""
+    start, _ = partition_bounds(campaign_id)
+    if start in _known_partitions:
+        return True
+    name = partition_name(start)
+    if not await session.scalar(text("SELECT to_regclass(:name)"), {"name": name}):
+        return False
+    _known_partitions.add(start)
+    return True
+
+
+async def drop_partition(start: int) -> bool:
+    """
+    Отсоединение и удаление секции кампаний [start, start + CAMPAIGN_PARTITION_SIZE)
+
+    Удаляет все строки секции разом, без построчного DELETE.
+
+    Returns:
+        False, если такой секции нет
+    """
+    name = partition_name(start)
+    async with engine.begin() as conn:
+        if not await conn.scalar(text("SELECT to_regclass(:name)"), {"name": name}):
+            return False
+        await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        await conn.execute(text(f"ALTER TABLE campaign_users DETACH PARTITION {name}"))
+        await conn.execute(text(f"DROP TABLE {name}"))
+    _known_partitions.discard(start)
+    logger.info(f"Удалена секция {name}")
+    return True
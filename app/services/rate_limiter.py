@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from typing import Optional
+from redis.asyncio import Redis
+from ..config import settings
+from ..redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Проверка глобального бакета и бакета чата за одну атомарную операцию.
+# Токены списываются, только если доступны в обоих бакетах, иначе
+# возвращается время ожидания в миллисекундах.
+TOKEN_BUCKET_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local paused = redis.call('PTTL', KEYS[3])
+if paused > 0 then
+    return paused
+end
+
+local function refill(key, rate, burst)
+    local data = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or burst
+    local ts = tonumber(data[2]) or now
+    return math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+end
+
+local global_rate = tonumber(ARGV[1])
+local global_burst = tonumber(ARGV[2])
+local chat_rate = tonumber(ARGV[3])
+local chat_burst = tonumber(ARGV[4])
+
+local global_tokens = refill(KEYS[1], global_rate, global_burst)
+local chat_tokens = refill(KEYS[2], chat_rate, chat_burst)
+
+local wait = 0
+if global_tokens < 1 then
+    wait = math.max(wait, math.ceil((1 - global_tokens) * 1000 / global_rate))
+end
+if chat_tokens < 1 then
+    wait = math.max(wait, math.ceil((1 - chat_tokens) * 1000 / chat_rate))
+end
+if wait > 0 then
+    return wait
+end
+
+redis.call('HSET', KEYS[1], 'tokens', global_tokens - 1, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(global_burst * 1000 / global_rate) + 1000)
+redis.call('HSET', KEYS[2], 'tokens', chat_tokens - 1, 'ts', now)
+redis.call('PEXPIRE', KEYS[2], math.ceil(chat_burst * 1000 / chat_rate) + 1000)
+return 0
+"""
+
+
+class TelegramRateLimiter:
+    """
+    Распределенный ограничитель частоты запросов к Telegram Bot API
+
+    Token bucket в Redis, общий для всех воркеров: глобальный бакет бота
+    и отдельный бакет на каждый чат. Ответ 429 приостанавливает
+    глобальный бакет на время из `retry_after`.
+    """
+
+    def __init__(
+        self,
+        bot_token: str,
+        global_rate: Optional[float] = None,
+        global_burst: Optional[int] = None,
+        chat_rate: Optional[float] = None,
+        chat_burst: Optional[int] = None,
+    ):
+        # Ключи строятся по ID бота, а не по полному токену
+        self.prefix = f"telegram:rl:{bot_token.split(':', 1)[0]}"
+        self.global_rate = global_rate or settings.TELEGRAM_GLOBAL_RATE
+        self.global_burst = global_burst or settings.TELEGRAM_GLOBAL_BURST
+        self.chat_rate = chat_rate or settings.TELEGRAM_CHAT_RATE
+        self.chat_burst = chat_burst or settings.TELEGRAM_CHAT_BURST
+        self._redis: Optional[Redis] = None
+        self._script = None
+
+    def _get_script(self):
+        redis = get_redis()
+        if self._script is None or self._redis is not redis:
+            self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+            self._redis = redis
+        return self._script
+
+    async def acquire(self, chat_id: str):
+        """Ожидание разрешения на отправку сообщения в чат"""
+        script = self._get_script()
+        keys = [
+            f"{self.prefix}:global",
+            f"{self.prefix}:chat:{chat_id}",
+            f"{self.prefix}:pause",
+        ]
+        args = [self.global_rate, self.global_burst, self.chat_rate, self.chat_burst]
+        while True:
+            wait_ms = int(await script(keys=keys, args=args))
+            if wait_ms <= 0:
+                return
+            await asyncio.sleep(wait_ms / 1000)
+
+    async def pause(self, retry_after: float):
+        """Приостановка отправки для всех воркеров на `retry_after` секунд"""
+        logger.warning(f"Telegram API ограничил частоту запросов, пауза {retry_after} с")
+        await get_redis().set(
+            f"{self.prefix}:pause", 1, px=max(1, int(retry_after * 1000))
+        )
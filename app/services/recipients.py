@@ -0,0 +1,167 @@
+from datetime import timedelta
+from collections import defaultdict
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from sqlalchemy import select, update, func, or_, any_, bindparam, DateTime, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+from ..config import settings
+from ..database import async_session
+from ..models.models import Campaign, CampaignUser, User, NotificationStatus
+from .delivery import Recipient
+
+campaign_users = CampaignUser.__table__
+users = User.__table__
+
+
+def db_utcnow():
+    """Текущее время UTC по часам базы данных, общим для всех воркеров"""
+    return func.timezone("UTC", func.now(), type_=DateTime)
+
+
+async def claim_recipient_batch(
+    campaign_id: int,
+    first_user_id: Optional[int] = None,
+    end_user_id: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    lease_seconds: Optional[int] = None,
+    user_ids: Optional[List[int]] = None,
+    lease_grace: float = 0,
+) -> List[Recipient]:
+    """
+    Захват пакета получателей для отправки
+
+    Выбираются только получатели в статусе PENDING без действующей аренды.
+    Строки блокируются через SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+    параллельные воркеры получают непересекающиеся пакеты, а аренда
+    не дает другим воркерам взять их до `lease_expires_at`.
+    Адреса получателей возвращаются тем же запросом (UPDATE ... FROM users),
+    минуя кэш пользователей: рассылка не заполняет Redis профилями.
+
+    Пакет стоит брать не больше очереди движка доставки, а аренду
+    ожидающих отправки продлевать (StatusWriter.hold): получатели,
+    ждущие дольше аренды, могут быть захвачены повторно.
+
+    `lease_grace` позволяет захватить получателей, аренда которых истекает
+    в ближайшие секунды: время повтора назначается по часам воркера,
+    а аренда проверяется по часам базы данных.
+    """
+    batch_size = batch_size or settings.RECIPIENT_BATCH_SIZE
+    lease = timedelta(seconds=lease_seconds or settings.RECIPIENT_LEASE_SECONDS)
+
+    candidates = (
+        select(campaign_users.c.user_id)
+        .where(
+            campaign_users.c.campaign_id == campaign_id,
+            campaign_users.c.status == NotificationStatus.PENDING,
+            or_(
+                campaign_users.c.lease_expires_at.is_(None),
+                campaign_users.c.lease_expires_at
+                < db_utcnow() + timedelta(seconds=lease_grace),
+            ),
+        )
+        .order_by(campaign_users.c.user_id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    if first_user_id is not None:
+        candidates = candidates.where(campaign_users.c.user_id >= first_user_id)
+    if end_user_id is not None:
+        candidates = candidates.where(campaign_users.c.user_id < end_user_id)
+    if user_ids is not None:
+        candidates = candidates.where(campaign_users.c.user_id == any_(
+            bindparam("user_ids", user_ids, type_=ARRAY(Integer))
+        ))
+
+    stmt = (
+        update(campaign_users)
+        .where(
+            campaign_users.c.campaign_id == campaign_id,
+            campaign_users.c.user_id.in_(candidates.scalar_subquery()),
+            users.c.id == campaign_users.c.user_id,
+        )
+        .values(lease_expires_at=db_utcnow() + lease)
+        .returning(
+            campaign_users.c.user_id,
+            campaign_users.c.attempts,
+            campaign_users.c.lease_expires_at,
+            campaign_users.c.delivered_channels,
+            users.c.email,
+            users.c.telegram_id,
+        )
+    )
+    async with async_session() as session:
+        rows = (await session.execute(stmt)).all()
+        await session.commit()
+
+    return [
+        Recipient(
+            user_id=row.user_id,
+            email=row.email,
+            telegram_id=row.telegram_id,
+            attempts=row.attempts,
+            lease_expires_at=row.lease_expires_at,
+            delivered_channels=tuple(row.delivered_channels),
+        )
+        for row in sorted(rows, key=lambda row: row.user_id)
+    ]
+
+
+async def claim_recipients(
+    campaign_id: int,
+    first_user_id: Optional[int] = None,
+    end_user_id: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    user_ids: Optional[List[int]] = None,
+    lease_grace: float = 0,
+    on_claim: Optional[Callable[[List[Recipient]], None]] = None,
+) -> AsyncIterator[Recipient]:
+    """
+    Захват и выдача получателей пакетами, пока не останется свободных
+
+    Повторный запуск после сбоя продолжает с неотправленных получателей:
+    уже отправленные не захватываются, а аренда упавшего воркера истекает.
+    `on_claim` вызывается с каждым захваченным пакетом.
+    """
+    while True:
+        batch = await claim_recipient_batch(
+            campaign_id, first_user_id, end_user_id, batch_size,
+            user_ids=user_ids, lease_grace=lease_grace,
+        )
+        if not batch:
+            return
+        if on_claim is not None:
+            on_claim(batch)
+        for recipient in batch:
+            yield recipient
+
+
+async def find_stalled_recipients(
+    min_idle: float,
+    limit: Optional[int] = None,
+) -> Dict[int, List[int]]:
+    """
+    Зависшие получатели незавершенных кампаний
+
+    Получатель в статусе PENDING, аренда которого истекла больше
+    `min_idle` секунд назад, сам отправлен не будет: повтор мог
+    потеряться между базой и очередью повторов в Redis, а захвативший
+    его воркер - упасть.
+
+    Returns:
+        campaign_id -> список user_id
+    """
+    stmt = (
+        select(campaign_users.c.campaign_id, campaign_users.c.user_id)
+        .join(Campaign, Campaign.id == campaign_users.c.campaign_id)
+        .where(
+            Campaign.started_at.isnot(None),
+            Campaign.completed_at.is_(None),
+            campaign_users.c.status == NotificationStatus.PENDING,
+            campaign_users.c.lease_expires_at < db_utcnow() - timedelta(seconds=min_idle),
+        )
+        .limit(limit or settings.RETRY_SWEEP_BATCH)
+    )
+    stalled: Dict[int, List[int]] = defaultdict(list)
+    async with async_session() as session:
+        for campaign_id, user_id in (await session.execute(stmt)).all():
+            stalled[campaign_id].append(user_id)
+    return dict(stalled)
@@ -0,0 +1,111 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import aiohttp
+import aiosmtplib
+from ..config import settings
+from ..redis_client import get_redis
+from .email import DISCONNECT_ERRORS
+from .telegram import TelegramAPIError
+
+RETRY_QUEUE_KEY = "notifications:retries"
+
+# Атомарное извлечение получателей, у которых подошло время повтора
+POP_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Экспоненциальная задержка повтора для класса ошибок"""
+    base_delay: float  # Задержка перед первым повтором, секунды
+    max_delay: float  # Максимальная задержка, секунды
+
+    def delay(self, attempt: int, hint: Optional[float] = None) -> float:
+        """Задержка перед повтором номер `attempt` (с 1) со случайным разбросом"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        delay = random.uniform(delay / 2, delay)
+        # Сервер мог сам указать, сколько ждать (retry_after)
+        return max(delay, hint or 0)
+
+
+RETRY_POLICIES: Dict[str, RetryPolicy] = {
+    "network": RetryPolicy(base_delay=5, max_delay=600),
+    "server": RetryPolicy(base_delay=30, max_delay=1800),
+    "rate_limit": RetryPolicy(base_delay=60, max_delay=3600),
+}
+
+
+def classify_error(error: Exception) -> Optional[str]:
+    """
+    Класс временной ошибки доставки
+
+    Returns:
+        Ключ RETRY_POLICIES или None, если ошибка постоянная
+        и повтор бессмысленен
+    """
+    if isinstance(error, TelegramAPIError):
+        if error.status == 429:
+            return "rate_limit"
+        if error.status >= 500:
+            return "server"
+        return None
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        if error.recipients and all(400 <= r.code < 500 for r in error.recipients):
+            return "server"
+        return None
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return "server" if 400 <= error.code < 500 else None
+    if isinstance(
+        error, DISCONNECT_ERRORS + (aiohttp.ClientError, asyncio.TimeoutError, OSError)
+    ):
+        return "network"
+    return None
+
+
+def retry_delay(error_class: str, attempt: int, error: Optional[Exception] = None) -> float:
+    """Задержка перед повтором с учетом retry_after из ответа сервера"""
+    hint = getattr(error, "retry_after", None)
+    return RETRY_POLICIES[error_class].delay(attempt, hint)
+
+
+async def schedule_retries(campaign_id: int, due: Dict[int, float]):
+    """
+    Постановка получателей в очередь повторов
+
+    Args:
+        campaign_id: ID кампании
+        due: user_id -> UNIX-время следующей попытки
+    """
+    if not due:
+        return
+    await get_redis().zadd(
+        RETRY_QUEUE_KEY,
+        {f"{campaign_id}:{user_id}": at for user_id, at in due.items()},
+    )
+
+
+async def pop_due_retries(limit: Optional[int] = None) -> Dict[int, List[int]]:
+    """
+    Извлечение получателей, у которых подошло время повтора
+
+    Returns:
+        campaign_id -> список user_id
+    """
+    members = await get_redis().eval(
+        POP_DUE_SCRIPT, 1, RETRY_QUEUE_KEY,
+        time.time(), limit or settings.RETRY_SWEEP_BATCH,
+    )
+    due: Dict[int, List[int]] = defaultdict(list)
+    for member in members:
+        campaign_id, user_id = member.split(":")
+        due[int(campaign_id)].append(int(user_id))
+    return dict(due)
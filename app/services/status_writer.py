@@ -0,0 +1,286 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import update, bindparam, cast, func, DateTime, Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from ..config import settings
+from ..database import async_session
+from ..models.models import CampaignUser, NotificationStatus
+from .campaign_stats import incr_stats, drop_stats, publish_progress
+from .delivery import Recipient
+from .recipients import db_utcnow
+from .retries import schedule_retries
+
+logger = logging.getLogger(__name__)
+
+campaign_users = CampaignUser.__table__
+
+# Пакет результатов передается массивами и разворачивается через unnest
+_batch = func.unnest(
+    cast(bindparam("user_ids"), ARRAY(Integer)),
+    cast(bindparam("statuses"), ARRAY(String)),
+    cast(bindparam("sent_at"), ARRAY(DateTime)),
+    cast(bindparam("attempts"), ARRAY(Integer)),
+    cast(bindparam("errors"), ARRAY(String)),
+    cast(bindparam("retry_at"), ARRAY(DateTime)),
+    cast(bindparam("leases"), ARRAY(DateTime)),
+    # unnest разворачивает и вложенные массивы, поэтому списки
+    # доставленных каналов передаются строками через запятую
+    cast(bindparam("channels"), ARRAY(String)),
+).table_valued(
+    "user_id", "status", "sent_at", "attempts", "last_error", "retry_at", "lease",
+    "channels",
+).render_derived(name="batch")
+
+# Один UPDATE на пакет. Результат сохраняется, только если получатель
+# все еще под арендой, с которой его захватили: после ее истечения
+# получателя мог захватить другой воркер
+UPDATE_STATUS = (
+    update(campaign_users)
+    .where(
+        campaign_users.c.campaign_id == bindparam("campaign_id"),
+        campaign_users.c.user_id == _batch.c.user_id,
+        campaign_users.c.lease_expires_at.is_not_distinct_from(_batch.c.lease),
+    )
+    .values(
+        status=cast(_batch.c.status, campaign_users.c.status.type),
+        sent_at=_batch.c.sent_at,
+        attempts=_batch.c.attempts,
+        last_error=_batch.c.last_error,
+        lease_expires_at=_batch.c.retry_at,
+        delivered_channels=func.string_to_array(_batch.c.channels, ",", type_=ARRAY(String)),
+    )
+    .returning(campaign_users.c.user_id)
+)
+
+_held = func.unnest(
+    cast(bindparam("user_ids"), ARRAY(Integer)),
+    cast(bindparam("leases"), ARRAY(DateTime)),
+).table_valued("user_id", "lease").render_derived(name="held")
+
+# Продление аренды захваченных, но еще не сохраненных получателей;
+# перехваченные другим воркером не продлеваются
+RENEW_LEASES = (
+    update(campaign_users)
+    .where(
+        campaign_users.c.campaign_id == bindparam("campaign_id"),
+        campaign_users.c.user_id == _held.c.user_id,
+        campaign_users.c.lease_expires_at.is_not_distinct_from(_held.c.lease),
+    )
+    .values(
+        lease_expires_at=db_utcnow() + timedelta(seconds=settings.RECIPIENT_LEASE_SECONDS)
+    )
+    .returning(campaign_users.c.user_id, campaign_users.c.lease_expires_at)
+)
+
+
+class StatusWriter:
+    """
+    Буферизированная запись статусов доставки
+
+    Результаты копятся в памяти и сохраняются пакетными UPDATE при
+    достижении `flush_size` записей или раз в `flush_interval` секунд,
+    а также при выходе из контекста. Получатели, отложенные для повтора,
+    после сохранения ставятся в очередь повторов. Результаты получателей,
+    аренда которых истекла и была перехвачена, не сохраняются и
+    не учитываются в счетчиках.
+
+    Аренда захваченных получателей (см. hold) продлевается раз в треть
+    RECIPIENT_LEASE_SECONDS, пока их результат не сохранен: ожидание
+    лимитов каналов не отдает их другим воркерам.
+    """
+
+    def __init__(
+        self,
+        campaign_id: int,
+        flush_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+    ):
+        self.campaign_id = campaign_id
+        self.flush_size = flush_size or settings.STATUS_FLUSH_SIZE
+        self.flush_interval = flush_interval or settings.STATUS_FLUSH_INTERVAL
+        self.renew_interval = settings.RECIPIENT_LEASE_SECONDS / 3
+        self._buffer: List[dict] = []
+        self._leases: Dict[int, datetime] = {}  # user_id -> действующая аренда
+        self._lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        self._flusher = asyncio.create_task(self._flush_periodically())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    def hold(self, recipients: Iterable[Recipient]):
+        """Учет захваченных получателей для продления их аренды"""
+        for recipient in recipients:
+            self._leases[recipient.user_id] = recipient.lease_expires_at
+
+    async def add(
+        self,
+        user_id: int,
+        status: NotificationStatus,
+        sent_at: Optional[datetime] = None,
+        attempts: int = 1,
+        error: Optional[str] = None,
+        lease_expires_at: Optional[datetime] = None,
+        delivered_channels: Iterable[str] = (),
+    ):
+        """
+        Добавление результата доставки в буфер
+
+        `lease_expires_at` - аренда, с которой получатель был захвачен.
+        """
+        await self._append(
+            user_id, status, sent_at, attempts, error, None, lease_expires_at,
+            delivered_channels,
+        )
+
+    async def add_retry(
+        self,
+        user_id: int,
+        retry_at: datetime,
+        attempts: int,
+        error: str,
+        lease_expires_at: Optional[datetime] = None,
+        delivered_channels: Iterable[str] = (),
+    ):
+        """
+        Откладывание получателя для повтора
+
+        Получатель остается в статусе PENDING, а аренда продлевается
+        до `retry_at`, чтобы его не захватили раньше времени. Повтор
+        отправит только каналы, не вошедшие в `delivered_channels`.
+        """
+        await self._append(
+            user_id, NotificationStatus.PENDING, None, attempts, error, retry_at,
+            lease_expires_at, delivered_channels,
+        )
+
+    async def _append(
+        self, user_id, status, sent_at, attempts, error, retry_at, lease, channels
+    ):
+        self._buffer.append({
+            "user_id": user_id,
+            "status": status,
+            "sent_at": sent_at,
+            "attempts": attempts,
+            "last_error": error[:settings.LAST_ERROR_MAX_LENGTH] if error else None,
+            "retry_at": retry_at,
+            "lease": lease,
+            "channels": ",".join(sorted(channels)),
+        })
+        if len(self._buffer) >= self.flush_size:
+            await self.flush()
+
+    async def flush(self):
+        """Сохранение накопленных результатов в базу данных"""
+        async with self._lock:
+            if not self._buffer:
+                return
+            rows, self._buffer = self._buffer, []
+            params = {
+                "campaign_id": self.campaign_id,
+                "user_ids": [row["user_id"] for row in rows],
+                "statuses": [row["status"].name for row in rows],
+                "sent_at": [row["sent_at"] for row in rows],
+                "attempts": [row["attempts"] for row in rows],
+                "errors": [row["last_error"] for row in rows],
+                "retry_at": [row["retry_at"] for row in rows],
+                "leases": [self._leases.get(row["user_id"], row["lease"]) for row in rows],
+                "channels": [row["channels"] for row in rows],
+            }
+            try:
+                async with async_session() as session:
+                    saved = set((await session.execute(UPDATE_STATUS, params)).scalars())
+                    await session.commit()
+            except Exception:
+                # Возвращаем записи в буфер для следующей попытки
+                self._buffer = rows + self._buffer
+                raise
+            for row in rows:
+                self._leases.pop(row["user_id"], None)
+            if len(saved) < len(rows):
+                logger.warning(
+                    f"Кампания {self.campaign_id}: не сохранено {len(rows) - len(saved)} "
+                    f"результатов, аренда получателей истекла"
+                )
+                rows = [row for row in rows if row["user_id"] in saved]
+            await self._schedule_retries(rows)
+            await self._update_stats(rows)
+
+    async def _schedule_retries(self, rows: List[dict]):
+        due = {
+            row["user_id"]: row["retry_at"].replace(tzinfo=timezone.utc).timestamp()
+            for row in rows
+            if row["retry_at"] is not None
+        }
+        try:
+            await schedule_retries(self.campaign_id, due)
+        except Exception as e:
+            # Получатели останутся PENDING: их повторно отправит проверка
+            # зависших получателей (sweep_stalled_recipients)
+            logger.error(f"Не удалось запланировать повторы кампании {self.campaign_id}: {str(e)}")
+
+    async def _update_stats(self, rows: List[dict]):
+        sent = sum(1 for row in rows if row["status"] == NotificationStatus.SENT)
+        failed = sum(1 for row in rows if row["status"] == NotificationStatus.FAILED)
+        dead_letter = sum(
+            1 for row in rows if row["status"] == NotificationStatus.DEAD_LETTER
+        )
+        if not (sent or failed or dead_letter):
+            return
+        try:
+            stats = await incr_stats(
+                self.campaign_id, sent=sent, failed=failed, dead_letter=dead_letter
+            )
+            if stats is not None:
+                await publish_progress(self.campaign_id, stats, sent, failed + dead_letter)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить счетчики кампании {self.campaign_id}: {str(e)}")
+            # Счетчики могли разойтись с базой, удаляем их в пользу подсчета в БД
+            try:
+                await drop_stats(self.campaign_id)
+            except Exception:
+                pass
+
+    async def renew_leases(self):
+        """Продление аренды получателей, результат которых еще не сохранен"""
+        async with self._lock:
+            if not self._leases:
+                return
+            params = {
+                "campaign_id": self.campaign_id,
+                "user_ids": list(self._leases),
+                "leases": list(self._leases.values()),
+            }
+            async with async_session() as session:
+                renewed = (await session.execute(RENEW_LEASES, params)).all()
+                await session.commit()
+            for user_id, lease in renewed:
+                self._leases[user_id] = lease
+
+    async def _flush_periodically(self):
+        renewed_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка сохранения статусов кампании {self.campaign_id}: {str(e)}")
+            if time.monotonic() - renewed_at < self.renew_interval:
+                continue
+            try:
+                await self.renew_leases()
+                renewed_at = time.monotonic()
+            except Exception as e:
+                logger.error(f"Ошибка продления аренды кампании {self.campaign_id}: {str(e)}")
@@ -1,62 +1,191 @@
-from aiogram import Bot
+from typing import Optional
 from ..config import settings
+import asyncio
 import logging
+import time
 import aiohttp
-import json
+from ..metrics import SEND_LATENCY, TELEGRAM_RATE_LIMITED, TELEGRAM_THROTTLE_WAIT
+from .rate_limiter import TelegramRateLimiter
 
 logger = logging.getLogger(__name__)
 
+
+class TelegramAPIError(Exception):
+    """Ошибка ответа Telegram Bot API"""
+
+    def __init__(self, status: int, description: str, retry_after: Optional[float] = None):
+        super().__init__(f"Telegram API error {status}: {description}")
+        self.status = status
+        self.description = description
+        self.retry_after = retry_after
+
+
+class TelegramClient:
+    """
+    Клиент Telegram Bot API с постоянным пулом соединений
+
+    Один экземпляр создается на процесс воркера и переиспользует
+    TCP/TLS соединения с keep-alive между сообщениями.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        base_url: Optional[str] = None,
+        connector_limit: Optional[int] = None,
+        timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        rate_limiter: Optional[TelegramRateLimiter] = None,
+    ):
+        self.token = token
+        self.rate_limiter = rate_limiter
+        self.base_url = (base_url or settings.TELEGRAM_API_URL).rstrip("/")
+        self.connector_limit = connector_limit or settings.TELEGRAM_CONNECTOR_LIMIT
+        self.timeout = aiohttp.ClientTimeout(
+            total=timeout or settings.TELEGRAM_TIMEOUT,
+            connect=connect_timeout or settings.TELEGRAM_CONNECT_TIMEOUT,
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        """Цикл событий, к которому привязан пул соединений"""
+        return self._loop
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connector_limit,
+                ttl_dns_cache=settings.TELEGRAM_DNS_CACHE_TTL,
+                keepalive_timeout=settings.TELEGRAM_KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+            )
+            self._loop = asyncio.get_running_loop()
+        return self._session
+
+    async def send_message(self, chat_id: str, text: str) -> bool:
+        """
+        Отправка сообщения в чат
+
+        При ответе 429 отправка приостанавливается на `retry_after`
+        и повторяется, пока не исчерпан лимит попыток. Время запроса
+        к API пишется в SEND_LATENCY без ожидания лимитера.
+
+        Raises:
+            TelegramAPIError: Если API вернул ошибку
+        """
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                waiting = time.perf_counter()
+                await self.rate_limiter.acquire(chat_id)
+                TELEGRAM_THROTTLE_WAIT.observe(time.perf_counter() - waiting)
+            started = time.perf_counter()
+            try:
+                return await self._post_message(chat_id, text)
+            except TelegramAPIError as e:
+                if e.status == 429:
+                    TELEGRAM_RATE_LIMITED.inc()
+                attempt += 1
+                if (
+                    e.status != 429
+                    or self.rate_limiter is None
+                    or attempt > settings.TELEGRAM_MAX_RATE_LIMIT_RETRIES
+                ):
+                    raise
+                await self.rate_limiter.pause(e.retry_after or 1)
+            finally:
+                SEND_LATENCY.labels("telegram").observe(time.perf_counter() - started)
+
+    async def _post_message(self, chat_id: str, text: str) -> bool:
+        url = f"{self.base_url}/bot{self.token}/sendMessage"
+        data = {
+            'chat_id': chat_id,
+            'text': text
+        }
+        headers = {
+            'Content-Type': 'application/x-www-form-urlencoded; charset=utf-8'
+        }
+        session = self._get_session()
+        async with session.post(url, data=data, headers=headers) as response:
+            if response.content_type != 'application/json':
+                raise TelegramAPIError(response.status, await response.text())
+
+            result = await response.json()
+            if response.status == 200 and result.get('ok'):
+                logger.debug(f"Сообщение отправлено в Telegram пользователю {chat_id}")
+                return True
+            parameters = result.get('parameters') or {}
+            raise TelegramAPIError(
+                response.status,
+                result.get('description', 'Unknown error'),
+                retry_after=parameters.get('retry_after'),
+            )
+
+    async def close(self):
+        """Закрытие пула соединений"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+
+_client: Optional[TelegramClient] = None
+
+
+def get_telegram_client() -> TelegramClient:
+    """
+    Получение клиента Telegram для текущего процесса
+
+    Raises:
+        ValueError: Если токен бота не настроен
+    """
+    global _client
+    if not settings.TELEGRAM_BOT_TOKEN:
+        raise ValueError("Telegram bot token not configured")
+
+    # Пул соединений привязан к циклу событий, в котором был создан
+    if _client is not None and _client.loop is not None:
+        if _client.loop is not asyncio.get_running_loop():
+            _client = None
+    if _client is None:
+        rate_limiter = None
+        if settings.TELEGRAM_RATE_LIMIT_ENABLED:
+            rate_limiter = TelegramRateLimiter(settings.TELEGRAM_BOT_TOKEN)
+        _client = TelegramClient(settings.TELEGRAM_BOT_TOKEN, rate_limiter=rate_limiter)
+    return _client
+
+
+async def close_telegram_client():
+    """Закрытие клиента Telegram текущего процесса"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
 async def send_telegram_message(telegram_id: str, text: str):
     """
     Отправка сообщения в Telegram через прямой API вызов
-    
+
     Args:
         telegram_id: ID пользователя в Telegram
         text: Текст сообщения
-        
+
     Returns:
         bool: True если сообщение отправлено успешно
-        
+
     Raises:
         ValueError: Если токен бота не настроен
         Exception: При ошибке отправки сообщения
     """
-    if not settings.TELEGRAM_BOT_TOKEN:
-        logger.warning(f"Токен Telegram бота не настроен. Сообщение для {telegram_id}: {text}")
-        raise ValueError("Telegram bot token not configured")
-
-    # Используем прямой API вызов для лучшей поддержки UTF-8
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
-    
-    # Убеждаемся, что текст правильно закодирован
-    logger.info(f"Отправляем текст в Telegram: {repr(text)}")
-    logger.info(f"Тип текста: {type(text)}")
-    logger.info(f"Длина текста: {len(text)}")
-    
-    data = {
-        'chat_id': telegram_id,
-        'text': text
-    }
-    
     try:
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded; charset=utf-8'
-        }
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, data=data, headers=headers) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    if result.get('ok'):
-                        logger.info(f"Сообщение успешно отправлено в Telegram пользователю {telegram_id}")
-                        return True
-                    else:
-                        error_msg = result.get('description', 'Unknown error')
-                        logger.error(f"Ошибка API Telegram: {error_msg}")
-                        raise Exception(f"Telegram API error: {error_msg}")
-                else:
-                    error_text = await response.text()
-                    logger.error(f"HTTP error {response.status}: {error_text}")
-                    raise Exception(f"HTTP error {response.status}: {error_text}")
+        return await get_telegram_client().send_message(telegram_id, text)
     except Exception as e:
-        logger.error(f"Ошибка отправки сообщения в Telegram пользователю {telegram_id}: {str(e)}")
-        raise e
\ No newline at end of file
+        # Результат отправки записывает вызывающий код, здесь только отладка
+        logger.debug(f"Ошибка отправки сообщения в Telegram пользователю {telegram_id}: {str(e)}")
+        raise
@@ -0,0 +1,260 @@
+import codecs
+import csv
+import json
+from collections import deque
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+from pydantic import ValidationError
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..cache import user_cache
+from ..config import settings
+from ..models.models import User
+from ..schemas.user import UserCreate, BulkImportError, BulkImportResult
+
+CSV_MEDIA_TYPE = "text/csv"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SUPPORTED_MEDIA_TYPES = (CSV_MEDIA_TYPE, NDJSON_MEDIA_TYPE)
+
+users = User.__table__
+
+# Номер строки и данные пользователя или ошибка разбора
+ParsedRow = Tuple[int, Union[dict, Exception]]
+
+# Upsert по email без затирания известного telegram_id пустым значением;
+# xmax = 0 только у строк, вставленных этим запросом
+UPSERT_USERS = insert(users)
+UPSERT_USERS = UPSERT_USERS.on_conflict_do_update(
+    index_elements=[users.c.email],
+    set_={"telegram_id": func.coalesce(UPSERT_USERS.excluded.telegram_id, users.c.telegram_id)},
+).returning(users.c.id, literal_column("xmax = 0").label("inserted"))
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Разбиение потока байтов на строки с инкрементальным декодированием UTF-8"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    async for chunk in chunks:
+        lines = (tail + decoder.decode(chunk)).split("\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail.rstrip("\r")
+
+
+class _LineFeed:
+    """
+    Источник строк для csv.reader, пополняемый из асинхронного потока
+
+    Запоминает строки, взятые для текущей записи: если reader запросил
+    строку, которой еще нет, запись не закончена и ее строки
+    возвращаются в начало очереди.
+    """
+
+    def __init__(self):
+        self.lines: deque = deque()  # Номер строки и ее текст
+        self.taken: List[Tuple[int, str]] = []
+        self.exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            self.exhausted = True
+            raise StopIteration
+        item = self.lines.popleft()
+        self.taken.append(item)
+        return item[1]
+
+    def start_record(self):
+        self.taken = []
+        self.exhausted = False
+
+    def unread(self):
+        self.lines.extendleft(reversed(self.taken))
+        self.taken = []
+
+
+def _read_records(
+    reader, feed: _LineFeed, final: bool
+) -> Iterator[Tuple[int, Union[List[str], csv.Error]]]:
+    """Записи из строк, накопленных в feed"""
+    max_lines = settings.BULK_IMPORT_MAX_RECORD_LINES
+    while feed.lines:
+        feed.start_record()
+        first_line = feed.lines[0][0]
+        try:
+            values = next(reader)
+        except csv.Error as e:
+            yield first_line, e
+            continue
+        if not feed.exhausted:
+            yield first_line, values
+            continue
+        # Значение в кавычках не закрыто в прочитанных строках
+        feed.unread()
+        if not final and len(feed.lines) <= max_lines:
+            return
+        # Вероятно, лишняя кавычка: первая строка записи считается ошибкой,
+        # следующие разбираются заново
+        feed.lines.popleft()
+        if final:
+            yield first_line, csv.Error("Unterminated quoted field")
+        else:
+            yield first_line, csv.Error(f"Record longer than {max_lines} lines")
+
+
+async def iter_csv(
+    lines: AsyncIterator[str],
+) -> AsyncIterator[Tuple[int, Union[List[str], csv.Error]]]:
+    """
+    Разбор потока строк CSV одним csv.reader
+
+    Границы записей определяет reader: значение в кавычках может занимать
+    несколько строк, но не больше BULK_IMPORT_MAX_RECORD_LINES. Незакрытая
+    кавычка дает ошибку разбора одной строки, не теряя следующие.
+
+    Returns:
+        Номер первой строки записи и ее значения или ошибка разбора
+    """
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        waiting = bool(feed.lines)
+        feed.lines.append((line_number, line + "\n"))
+        # Незаконченная запись может закончиться только на строке с кавычкой
+        if (
+            waiting
+            and '"' not in line
+            and len(feed.lines) <= settings.BULK_IMPORT_MAX_RECORD_LINES
+        ):
+            continue
+        for record in _read_records(reader, feed, final=False):
+            yield record
+    for record in _read_records(reader, feed, final=True):
+        yield record
+
+
+def _parse_csv(values: List[str], header: List[str]) -> dict:
+    if len(values) > len(header):
+        raise ValueError("Too many columns")
+    row = dict(zip(header, values))
+    # Пустое значение в CSV означает отсутствие telegram_id
+    return {key: value or None for key, value in row.items()}
+
+
+def _parse_ndjson(line: str) -> dict:
+    row = json.loads(line)
+    if not isinstance(row, dict):
+        raise ValueError("Expected a JSON object")
+    return row
+
+
+class UserImporter:
+    """
+    Потоковый импорт пользователей
+
+    Строки проверяются по мере чтения и сохраняются пакетами по
+    `batch_size` через INSERT ... ON CONFLICT (email) DO UPDATE,
+    каждый пакет в отдельной транзакции. В памяти хранится только
+    текущий пакет и не больше `max_errors` описаний ошибок.
+    """
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        batch_size: Optional[int] = None,
+        max_errors: Optional[int] = None,
+    ):
+        self.session = session
+        self.batch_size = batch_size or settings.BULK_IMPORT_BATCH_SIZE
+        self.max_errors = max_errors or settings.BULK_IMPORT_MAX_ERRORS
+        self.result = BulkImportResult()
+        self._batch: Dict[str, dict] = {}
+
+    def _add_error(self, line_number: int, error: str):
+        self.result.failed += 1
+        if len(self.result.errors) < self.max_errors:
+            self.result.errors.append(BulkImportError(line=line_number, error=error))
+
+    async def _add(self, line_number: int, row: dict):
+        try:
+            user = UserCreate.model_validate(row)
+        except ValidationError as e:
+            error = e.errors()[0]
+            location = ".".join(str(part) for part in error["loc"])
+            self._add_error(line_number, f"{location}: {error['msg']}")
+            return
+
+        # Повтор email внутри пакета: побеждает последняя строка
+        if user.email in self._batch:
+            self.result.updated += 1
+        self._batch[user.email] = user.model_dump()
+        if len(self._batch) >= self.batch_size:
+            await self._flush()
+
+    async def _flush(self):
+        if not self._batch:
+            return
+        rows, self._batch = list(self._batch.values()), {}
+        result = await self.session.execute(UPSERT_USERS, rows)
+        updated_ids = [row.id for row in result if not row.inserted]
+        await self.session.commit()
+        await user_cache.invalidate(*updated_ids)
+        self.result.inserted += len(rows) - len(updated_ids)
+        self.result.updated += len(updated_ids)
+
+    async def run(self, lines: AsyncIterator[str], media_type: str) -> BulkImportResult:
+        """Импорт строк в формате CSV (с заголовком) или NDJSON"""
+        if media_type == CSV_MEDIA_TYPE:
+            rows = _csv_rows(lines)
+        else:
+            rows = _ndjson_rows(lines)
+        async for line_number, row in rows:
+            self.result.total += 1
+            if isinstance(row, Exception):
+                self._add_error(line_number, str(row))
+                continue
+            await self._add(line_number, row)
+
+        await self._flush()
+        return self.result
+
+
+async def _csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[ParsedRow]:
+    header: Optional[List[str]] = None
+    async for line_number, values in iter_csv(lines):
+        if isinstance(values, csv.Error):
+            yield line_number, values
+            continue
+        if not any(value.strip() for value in values):
+            continue
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+        try:
+            yield line_number, _parse_csv(values, header)
+        except ValueError as e:
+            yield line_number, e
+
+
+async def _ndjson_rows(lines: AsyncIterator[str]) -> AsyncIterator[ParsedRow]:
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            yield line_number, _parse_ndjson(line)
+        except ValueError as e:
+            yield line_number, e
+
+
+def parse_media_type(content_type: Optional[str]) -> str:
+    """Тип содержимого без параметров (charset и т.п.)"""
+    return (content_type or "").split(";")[0].strip().lower()
@@ -1,6 +1,23 @@
 from celery import Celery
 from ..config import settings
 
+# Очереди по классам приоритета кампаний; воркер, слушающий несколько
+# очередей, всегда сначала забирает задачи из более приоритетной
+PRIORITY_QUEUES = {
+    "high": "notifications.high",
+    "normal": "notifications",
+    "bulk": "notifications.bulk",
+}
+DEFAULT_QUEUE = PRIORITY_QUEUES["normal"]
+# Периодические служебные задачи: не занимают очереди кампаний
+MAINTENANCE_QUEUE = "notifications.maintenance"
+
+
+def queue_for(priority: str) -> str:
+    """Очередь задач кампании с указанным приоритетом"""
+    return PRIORITY_QUEUES.get(priority, DEFAULT_QUEUE)
+
+
 celery_app = Celery(
     "notification_service",
     broker=settings.REDIS_URL,
@@ -18,8 +35,41 @@ celery_app.conf.update(
     result_serializer='json',
     timezone='UTC',
     enable_utc=True,
+    # Задачи кампаний явно отправляются в очередь ее приоритета,
+    # маршруты задают очередь по умолчанию
     task_routes={
-        "app.tasks.notification_tasks.*": {"queue": "notifications"}
+        "send_notifications": {"queue": DEFAULT_QUEUE},
+        "send_notifications_chunk": {"queue": DEFAULT_QUEUE},
+        "finalize_campaign": {"queue": DEFAULT_QUEUE},
+        "retry_notifications": {"queue": DEFAULT_QUEUE},
+        "resume_campaign": {"queue": DEFAULT_QUEUE},
+        "sweep_retries": {"queue": MAINTENANCE_QUEUE},
+        "sweep_stalled_recipients": {"queue": MAINTENANCE_QUEUE},
+        "ensure_partitions": {"queue": MAINTENANCE_QUEUE},
+        "archive_campaigns": {"queue": MAINTENANCE_QUEUE},
+    },
+    # Очереди опрашиваются в порядке, указанном в -Q, а не по кругу
+    broker_transport_options={"queue_order_strategy": "priority"},
+    # Воркер берет следующий чанк только после завершения текущего,
+    # поэтому срочная кампания начинается между чанками массовой
+    worker_prefetch_multiplier=1,
+    beat_schedule={
+        "sweep-retries": {
+            "task": "sweep_retries",
+            "schedule": settings.RETRY_SWEEP_INTERVAL,
+        },
+        "sweep-stalled-recipients": {
+            "task": "sweep_stalled_recipients",
+            "schedule": settings.STALLED_SWEEP_INTERVAL,
+        },
+        "ensure-partitions": {
+            "task": "ensure_partitions",
+            "schedule": settings.PARTITION_CHECK_INTERVAL,
+        },
+        "archive-campaigns": {
+            "task": "archive_campaigns",
+            "schedule": settings.ARCHIVE_INTERVAL,
+        },
     },
     # Настройки кодировки для корректной работы с UTF-8
     worker_hijack_root_logger=False,
@@ -1,59 +1,367 @@
 import asyncio
-from datetime import datetime
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from ..models.models import User, Campaign, CampaignUser, NotificationStatus
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from celery import chord, group
+from sqlalchemy import select, update, func
+from ..models.models import Campaign, CampaignUser, NotificationStatus
+from ..config import settings
 from ..database import async_session
-from .celery_app import celery_app
+from ..cache import campaign_cache
+from .celery_app import celery_app, queue_for
+from .worker import run_async
+from ..metrics import CAMPAIGN_RECIPIENTS, log_sampled
 from ..services.telegram import send_telegram_message
+from ..services.email import send_email
+from ..services.delivery import DeliveryEngine, Recipient
+from ..services.recipients import claim_recipients, find_stalled_recipients
+from ..services.status_writer import StatusWriter
+from ..services.campaign_stats import count_stats, init_stats, publish_completed
+from ..services.retries import classify_error, retry_delay, pop_due_retries
+from ..services.archive import archive_finished_campaigns
+from ..services.partitions import ensure_partitions_ahead
 
-@celery_app.task(name='send_notifications')
+logger = logging.getLogger(__name__)
+
+@celery_app.task(name='send_notifications', acks_late=True, reject_on_worker_lost=True)
 def send_notifications(campaign_id: int):
-    """Отправка уведомлений для кампании"""
-    return asyncio.run(_send_notifications(campaign_id))
+    """
+    Координатор рассылки: разбивает получателей кампании на чанки
+    по диапазонам user_id и запускает их параллельную обработку
+    """
+    plan = run_async(_get_chunk_ranges(campaign_id))
+    if plan is None:
+        return
+    queue, ranges = plan
+
+    logger.info(f"Кампания {campaign_id} разбита на {len(ranges)} чанков, очередь {queue}")
+    if not ranges:
+        finalize_campaign.apply_async(([], campaign_id), queue=queue)
+        return
+
+    # Чанки и завершение идут в очередь приоритета кампании. Если чанк
+    # упал после всех перезапусков, finalize_campaign не выполнится:
+    # вместо него кампанию дообработает resume_campaign
+    chord(
+        group(
+            send_notifications_chunk.s(campaign_id, first_user_id, end_user_id).set(queue=queue)
+            for first_user_id, end_user_id in ranges
+        )
+    )(
+        finalize_campaign.s(campaign_id).set(queue=queue)
+        .on_error(campaign_chunks_failed.s(campaign_id))
+    )
+
+@celery_app.task(
+    name='send_notifications_chunk',
+    acks_late=True,
+    reject_on_worker_lost=True,
+    # Перезапуск продолжает с неотправленных получателей чанка
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    max_retries=settings.CHUNK_MAX_RETRIES,
+)
+def send_notifications_chunk(
+    campaign_id: int,
+    first_user_id: int,
+    end_user_id: Optional[int] = None,
+):
+    """Отправка уведомлений получателям кампании с user_id в [first_user_id, end_user_id)"""
+    return run_async(_send_notifications(campaign_id, first_user_id, end_user_id))
+
+@celery_app.task(name='campaign_chunks_failed')
+def campaign_chunks_failed(request, exc, traceback, campaign_id: int):
+    """Обработчик ошибки chord: чанк кампании упал после всех перезапусков"""
+    logger.error(f"Чанк кампании {campaign_id} завершился ошибкой: {exc!r}")
+    queues = run_async(_get_campaign_queues([campaign_id]))
+    resume_campaign.apply_async(
+        (campaign_id,), queue=queues.get(campaign_id, queue_for("normal"))
+    )
+
+@celery_app.task(
+    name='resume_campaign',
+    acks_late=True,
+    reject_on_worker_lost=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    max_retries=settings.CHUNK_MAX_RETRIES,
+)
+def resume_campaign(campaign_id: int):
+    """
+    Дообработка всех неотправленных получателей кампании и ее завершение
+
+    Получатели, захваченные упавшим чанком, освободятся по истечении
+    аренды и будут отправлены проверкой зависших получателей.
+    """
+    run_async(_send_notifications(campaign_id))
+    run_async(_complete_campaign_if_done(campaign_id))
+
+@celery_app.task(name='finalize_campaign')
+def finalize_campaign(results: List[dict], campaign_id: int):
+    """Завершение кампании после обработки всех чанков"""
+    sent = sum(r["sent"] for r in results if r)
+    failed = sum(r["failed"] for r in results if r)
+    retrying = sum(r["retrying"] for r in results if r)
+    logger.info(f"Обработаны чанки кампании {campaign_id}: отправлено {sent}, "
+                f"ошибок {failed}, отложено для повтора {retrying}")
+    run_async(_complete_campaign_if_done(campaign_id))
+
+@celery_app.task(name='retry_notifications', acks_late=True, reject_on_worker_lost=True)
+def retry_notifications(campaign_id: int, user_ids: List[int]):
+    """Повторная отправка уведомлений получателям, у которых подошло время повтора"""
+    run_async(_send_notifications(campaign_id, user_ids=user_ids))
+    run_async(_complete_campaign_if_done(campaign_id))
+
+@celery_app.task(name='sweep_retries')
+def sweep_retries():
+    """Периодическая постановка в очередь получателей, у которых подошло время повтора"""
+    due = run_async(pop_due_retries())
+    if not due:
+        return
+    queues = run_async(_get_campaign_queues(list(due)))
+    for campaign_id, user_ids in due.items():
+        retry_notifications.apply_async(
+            (campaign_id, user_ids), queue=queues.get(campaign_id, queue_for("normal"))
+        )
+
+@celery_app.task(name='sweep_stalled_recipients')
+def sweep_stalled_recipients():
+    """
+    Периодическая проверка незавершенных кампаний по базе данных
+
+    Повторно отправляет получателей, зависших в PENDING с истекшей арендой,
+    и завершает кампании, в которых ожидающих получателей не осталось.
+    """
+    stalled = run_async(find_stalled_recipients(settings.STALLED_SWEEP_INTERVAL))
+    if stalled:
+        queues = run_async(_get_campaign_queues(list(stalled)))
+        for campaign_id, user_ids in stalled.items():
+            logger.warning(f"Кампания {campaign_id}: повторная постановка "
+                           f"{len(user_ids)} зависших получателей")
+            retry_notifications.apply_async(
+                (campaign_id, user_ids), queue=queues.get(campaign_id, queue_for("normal"))
+            )
+    run_async(_complete_idle_campaigns())
+
+@celery_app.task(name='ensure_partitions')
+def ensure_partitions():
+    """Периодическое создание секций campaign_users для будущих кампаний"""
+    run_async(ensure_partitions_ahead())
+
+@celery_app.task(name='archive_campaigns')
+def archive_campaigns():
+    """Периодический перенос давно завершенных кампаний в архив"""
+    archived = run_async(archive_finished_campaigns())
+    if archived:
+        logger.info(f"Перенесено в архив кампаний: {archived}")
+
+async def _get_campaign_queues(campaign_ids: List[int]) -> Dict[int, str]:
+    """Очереди задач кампаний по их приоритету"""
+    campaigns = await campaign_cache.get_many(campaign_ids)
+    return {
+        campaign_id: queue_for(campaign.priority.value)
+        for campaign_id, campaign in campaigns.items()
+    }
 
-async def _send_notifications(campaign_id: int):
+async def _get_chunk_ranges(
+    campaign_id: int,
+) -> Optional[Tuple[str, List[Tuple[int, Optional[int]]]]]:
+    """
+    Очередь и границы чанков кампании
+
+    Returns:
+        Очередь приоритета кампании и список полуинтервалов
+        (first_user_id, end_user_id) по CAMPAIGN_CHUNK_SIZE получателей,
+        последний открыт справа. None, если кампания не найдена.
+    """
     async with async_session() as session:
-        # Получаем кампанию и её пользователей с полной загрузкой relationships
-        stmt = select(Campaign).where(Campaign.id == campaign_id).options(
-            selectinload(Campaign.users).selectinload(CampaignUser.user)
+        campaign = await session.get(Campaign, campaign_id)
+        if not campaign:
+            logger.warning(f"Кампания с ID {campaign_id} не найдена")
+            return None
+
+        # Каждый CAMPAIGN_CHUNK_SIZE-й user_id становится началом чанка
+        numbered = (
+            select(
+                CampaignUser.user_id,
+                func.row_number().over(order_by=CampaignUser.user_id).label("rn"),
+            )
+            .where(CampaignUser.campaign_id == campaign_id)
+            .subquery()
+        )
+        stmt = (
+            select(numbered.c.user_id)
+            .where((numbered.c.rn - 1) % settings.CAMPAIGN_CHUNK_SIZE == 0)
+            .order_by(numbered.c.user_id)
         )
         result = await session.execute(stmt)
-        campaign = result.scalar_one_or_none()
-        
-        if not campaign:
-            print(f"Кампания с ID {campaign_id} не найдена")
-            return
+        starts = list(result.scalars().all())
 
-        print(f"Начинаем отправку уведомлений для кампании {campaign_id}")
-
-        for campaign_user in campaign.users:
-            try:
-                # Имитация отправки email
-                await simulate_email_send(campaign_user.user.email, campaign.text)
-                
-                # Если у пользователя есть telegram_id, отправляем сообщение в Telegram
-                if campaign_user.user.telegram_id:
-                    await send_telegram_message(
-                        campaign_user.user.telegram_id,
-                        campaign.text
-                    )
-                
-                campaign_user.status = NotificationStatus.SENT
-                campaign_user.sent_at = datetime.utcnow()
-                print(f"Уведомление отправлено пользователю {campaign_user.user.email}")
-                
-            except Exception as e:
-                campaign_user.status = NotificationStatus.FAILED
-                print(f"Ошибка отправки уведомления пользователю {campaign_user.user.email}: {str(e)}")
-            
-            # Сохраняем изменения для каждого пользователя
+        stats = await count_stats(session, campaign_id)
+        if campaign.started_at is None:
+            campaign.started_at = datetime.utcnow()
             await session.commit()
+            await campaign_cache.invalidate(campaign_id)
+
+    try:
+        await init_stats(campaign_id, stats)
+    except Exception as e:
+        logger.warning(f"Не удалось инициализировать счетчики кампании {campaign_id}: {str(e)}")
+
+    return queue_for(campaign.priority.value), list(zip(starts, starts[1:] + [None]))
+
+async def _send_notifications(
+    campaign_id: int,
+    first_user_id: Optional[int] = None,
+    end_user_id: Optional[int] = None,
+    user_ids: Optional[List[int]] = None,
+) -> Optional[dict]:
+    campaign = await campaign_cache.get(campaign_id)
+    if campaign is None:
+        logger.warning(f"Кампания с ID {campaign_id} не найдена")
+        return None
+    text = campaign.text
+
+    delivery = DeliveryEngine(
+        text,
+        email_sender=send_email if settings.SMTP_HOST else simulate_email_send,
+        telegram_sender=send_telegram_message,
+    )
+    # Захватываем не больше, чем помещается в очередь движка; аренду
+    # ожидающих отправки продлевает StatusWriter
+    claim = {"batch_size": min(settings.RECIPIENT_BATCH_SIZE, delivery.queue_size)}
+    if user_ids is not None:
+        logger.info(f"Повторная отправка уведомлений для кампании {campaign_id}: "
+                    f"{len(user_ids)} получателей")
+        claim.update(user_ids=user_ids, lease_grace=settings.RETRY_LEASE_GRACE)
+    elif first_user_id is None and end_user_id is None:
+        logger.info(f"Дообработка получателей кампании {campaign_id}")
+    else:
+        logger.info(f"Начинаем отправку уведомлений для кампании {campaign_id}, "
+                    f"чанк с user_id {first_user_id}")
+        claim.update(first_user_id=first_user_id, end_user_id=end_user_id)
+
+    counts = {"sent": 0, "failed": 0, "retrying": 0}
+    processed = CAMPAIGN_RECIPIENTS.labels(status="sent")
+    async with StatusWriter(campaign_id) as writer:
+        recipients = claim_recipients(campaign_id, on_claim=writer.hold, **claim)
+
+        async def on_result(
+            recipient: Recipient, error: Exception | None, delivered: FrozenSet[str]
+        ):
+            attempts = recipient.attempts + 1
+            if error is None:
+                counts["sent"] += 1
+                processed.inc()
+                await writer.add(
+                    recipient.user_id, NotificationStatus.SENT, datetime.utcnow(),
+                    attempts=attempts, lease_expires_at=recipient.lease_expires_at,
+                    delivered_channels=delivered,
+                )
+                log_sampled(
+                    logger, logging.INFO, "Уведомление отправлено",
+                    campaign_id=campaign_id, user_id=recipient.user_id, attempts=attempts,
+                )
+                return
+
+            description = f"{type(error).__name__}: {error}"
+            error_class = classify_error(error)
+            if error_class is not None and attempts < settings.RETRY_MAX_ATTEMPTS:
+                # Временная ошибка: откладываем получателя, не занимая воркер ожиданием
+                counts["retrying"] += 1
+                CAMPAIGN_RECIPIENTS.labels(status="retry").inc()
+                delay = retry_delay(error_class, attempts, error)
+                await writer.add_retry(
+                    recipient.user_id,
+                    datetime.utcnow() + timedelta(seconds=delay),
+                    attempts=attempts,
+                    error=description,
+                    lease_expires_at=recipient.lease_expires_at,
+                    delivered_channels=delivered,
+                )
+                log_sampled(
+                    logger, logging.WARNING, "Ошибка отправки уведомления, повтор отложен",
+                    campaign_id=campaign_id, user_id=recipient.user_id, attempts=attempts,
+                    delay=round(delay), error=repr(description),
+                )
+                return
+
+            counts["failed"] += 1
+            status = (
+                NotificationStatus.FAILED if error_class is None
+                else NotificationStatus.DEAD_LETTER
+            )
+            CAMPAIGN_RECIPIENTS.labels(status=status.value).inc()
+            await writer.add(
+                recipient.user_id, status, attempts=attempts, error=description,
+                lease_expires_at=recipient.lease_expires_at, delivered_channels=delivered,
+            )
+            log_sampled(
+                logger, logging.WARNING, "Ошибка отправки уведомления",
+                campaign_id=campaign_id, user_id=recipient.user_id, attempts=attempts,
+                status=status.value, error=repr(description),
+            )
+
+        await delivery.run(recipients, on_result)
+
+    return counts
 
-        print(f"Завершена отправка уведомлений для кампании {campaign_id}")
+async def _complete_campaign_if_done(campaign_id: int):
+    """Отметка о завершении кампании, если не осталось ожидающих получателей"""
+    completed_at = datetime.utcnow()
+    async with async_session() as session:
+        pending = await session.scalar(
+            select(CampaignUser.user_id)
+            .where(
+                CampaignUser.campaign_id == campaign_id,
+                CampaignUser.status == NotificationStatus.PENDING,
+            )
+            .limit(1)
+        )
+        if pending is not None:
+            return
+
+        result = await session.execute(
+            update(Campaign)
+            .where(Campaign.id == campaign_id, Campaign.completed_at.is_(None))
+            .values(completed_at=completed_at)
+            .returning(Campaign.id)
+        )
+        completed = result.scalar_one_or_none() is not None
+        await session.commit()
+    if not completed:
+        return
+    await campaign_cache.invalidate(campaign_id)
+
+    logger.info(f"Завершена отправка уведомлений для кампании {campaign_id}")
+
+    try:
+        await publish_completed(campaign_id, completed_at)
+    except Exception as e:
+        logger.warning(f"Не удалось опубликовать завершение кампании {campaign_id}: {str(e)}")
+
+async def _complete_idle_campaigns():
+    """Завершение начатых кампаний без ожидающих получателей"""
+    pending = (
+        select(CampaignUser.user_id)
+        .where(
+            CampaignUser.campaign_id == Campaign.id,
+            CampaignUser.status == NotificationStatus.PENDING,
+        )
+        .exists()
+    )
+    async with async_session() as session:
+        campaign_ids = (await session.scalars(
+            select(Campaign.id).where(
+                Campaign.started_at.isnot(None),
+                Campaign.completed_at.is_(None),
+                ~pending,
+            )
+        )).all()
+    for campaign_id in campaign_ids:
+        await _complete_campaign_if_done(campaign_id)
 
 async def simulate_email_send(email: str, text: str):
-    """Имитация отправки email"""
+    """Имитация отправки email, если SMTP сервер не настроен"""
     await asyncio.sleep(1)
-    print(f"Email отправлен на {email}: {text}")
\ No newline at end of file
+    log_sampled(logger, logging.INFO, "Email имитирован", email=email)
@@ -0,0 +1,56 @@
+import asyncio
+from typing import Optional
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
+from celery.utils.log import current_process_index
+from ..database import engine, replica_engine, dispose_engines
+from ..metrics import start_worker_exporter
+from ..redis_client import close_redis
+from ..services.email import close_smtp_pool
+from ..services.telegram import close_telegram_client
+
+# Цикл событий процесса воркера: на нем живут пул соединений с базой,
+# HTTP/SMTP клиенты и Redis, поэтому задачи не создают их заново
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Постоянный цикл событий текущего процесса"""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+
+def run_async(coro):
+    """Выполнение корутины задачи на цикле событий процесса"""
+    return get_loop().run_until_complete(coro)
+
+
+async def close_clients():
+    """Закрытие сетевых клиентов и пула соединений с базой"""
+    await close_telegram_client()
+    await close_smtp_pool()
+    await close_redis()
+    await dispose_engines()
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    # Соединения, унаследованные от родительского процесса, не используем
+    engine.sync_engine.dispose(close=False)
+    if replica_engine is not None:
+        replica_engine.sync_engine.dispose(close=False)
+    get_loop()
+    start_worker_exporter(current_process_index(base=0))
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    global _loop
+    if _loop is None or _loop.is_closed():
+        return
+    _loop.run_until_complete(close_clients())
+    _loop.close()
+    _loop = None
@@ -0,0 +1,151 @@
+import asyncio
+import random
+import socket
+import time
+from dataclasses import dataclass
+from typing import Optional
+from aiohttp import web
+from aiosmtpd.controller import Controller
+
+
+@dataclass
+class ChannelBehavior:
+    """Поведение имитируемого канала доставки"""
+    latency: float = 0.0  # Задержка ответа, секунды
+    jitter: float = 0.0  # Случайная добавка к задержке, секунды
+    error_rate: float = 0.0  # Доля ответов с временной ошибкой
+    max_rps: Optional[int] = None  # Лимит запросов в секунду, сверх него 429
+    retry_after: int = 1  # retry_after в ответах 429
+
+    async def delay(self):
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+class _RateWindow:
+    """Счетчик запросов в текущей секунде"""
+
+    def __init__(self, limit: Optional[int]):
+        self.limit = limit
+        self._second = 0
+        self._count = 0
+
+    def exceeded(self) -> bool:
+        if not self.limit:
+            return False
+        second = int(time.monotonic())
+        if second != self._second:
+            self._second, self._count = second, 0
+        self._count += 1
+        return self._count > self.limit
+
+
+class FakeTelegramServer:
+    """
+    Имитация Telegram Bot API (только sendMessage)
+
+    Отвечает с задержкой `behavior.latency`, возвращает 500 с долей
+    `behavior.error_rate` и 429 с `retry_after` при превышении `max_rps`.
+    """
+
+    def __init__(self, behavior: ChannelBehavior, host: str = "127.0.0.1", port: int = 0):
+        self.behavior = behavior
+        self.host = host
+        self.port = port
+        self.received = 0
+        self.delivered = 0
+        self.rate_limited = 0
+        self._window = _RateWindow(behavior.max_rps)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def _send_message(self, request: web.Request) -> web.Response:
+        await request.post()
+        self.received += 1
+        if self._window.exceeded():
+            self.rate_limited += 1
+            retry_after = self.behavior.retry_after
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }, status=429)
+
+        await self.behavior.delay()
+        if self.behavior.should_fail():
+            return web.json_response({
+                "ok": False, "error_code": 500, "description": "Internal Server Error",
+            }, status=500)
+        self.delivered += 1
+        return web.json_response({"ok": True, "result": {"message_id": self.delivered}})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/sendMessage", self._send_message)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class _SMTPHandler:
+    def __init__(self, server: "FakeSMTPServer"):
+        self.server = server
+
+    async def handle_DATA(self, server, session, envelope):
+        fake = self.server
+        fake.received += 1
+        if fake._window.exceeded():
+            fake.rate_limited += 1
+            return "421 4.7.0 Too many messages, slow down"
+        await fake.behavior.delay()
+        if fake.behavior.should_fail():
+            return "451 4.3.0 Temporary local problem"
+        fake.delivered += 1
+        return "250 OK"
+
+
+class FakeSMTPServer:
+    """
+    Имитация SMTP сервера без TLS и авторизации
+
+    Работает в отдельном потоке (aiosmtpd Controller). Временные ошибки
+    возвращаются кодом 451, превышение `max_rps` - кодом 421.
+    """
+
+    def __init__(self, behavior: ChannelBehavior, host: str = "127.0.0.1", port: int = 0):
+        self.behavior = behavior
+        self.host = host
+        self.port = port or free_port(host)
+        self.received = 0
+        self.delivered = 0
+        self.rate_limited = 0
+        self._window = _RateWindow(behavior.max_rps)
+        self._controller = Controller(
+            _SMTPHandler(self), hostname=host, port=self.port
+        )
+
+    def start(self):
+        self._controller.start()
+
+    def stop(self):
+        self._controller.stop()
+
+
+def free_port(host: str = "127.0.0.1") -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
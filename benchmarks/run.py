@@ -0,0 +1,370 @@
+"""
+Сквозной бенчмарк рассылки
+
+Запускает имитации Telegram Bot API и SMTP сервера, веб-приложение
+и воркер Celery, настроенные на них, создает N пользователей через
+массовый импорт, проводит кампании через POST /campaigns/ и выводит
+результаты в формате JSON.
+
+Нужны PostgreSQL с примененными миграциями и Redis из .env; используйте
+отдельную базу данных, созданные пользователи не удаляются.
+
+    python -m benchmarks.run --users 10000 --latency 0.05 --output result.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+import aiohttp
+from prometheus_client.parser import text_string_to_metric_families
+from app.tasks.celery_app import MAINTENANCE_QUEUE, PRIORITY_QUEUES
+from .fakes import ChannelBehavior, FakeSMTPServer, FakeTelegramServer, free_port
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000, help="Пользователей в кампании")
+    parser.add_argument("--campaigns", type=int, default=1, help="Кампаний подряд")
+    parser.add_argument("--telegram-ratio", type=float, default=0.5,
+                        help="Доля пользователей с telegram_id")
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка каналов, секунды")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Разброс задержки, секунды")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Доля временных ошибок каналов")
+    parser.add_argument("--telegram-max-rps", type=int, default=None,
+                        help="Лимит Telegram в секунду, сверх него ответ 429")
+    parser.add_argument("--smtp-max-rps", type=int, default=None,
+                        help="Лимит SMTP в секунду, сверх него код 421")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429")
+    parser.add_argument("--priority", choices=list(PRIORITY_QUEUES), default="normal",
+                        help="Приоритет кампаний")
+    parser.add_argument("--worker-concurrency", type=int, default=1,
+                        help="Процессов в пуле воркера Celery")
+    parser.add_argument("--metrics-port", type=int, default=19100,
+                        help="Порт метрик первого процесса воркера")
+    parser.add_argument("--timeout", type=float, default=3600, help="Ожидание кампании, секунды")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Дополнительные настройки для веб-приложения и воркера")
+    parser.add_argument("--output", help="Файл для результатов (по умолчанию stdout)")
+    return parser.parse_args(argv)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Метрики Prometheus
+
+def _parse_metrics(text: str) -> Dict[str, Dict[tuple, float]]:
+    """Значения сэмплов: имя -> (отсортированные метки) -> значение"""
+    samples: Dict[str, Dict[tuple, float]] = {}
+    for family in text_string_to_metric_families(text):
+        for sample in family.samples:
+            labels = tuple(sorted(sample.labels.items()))
+            samples.setdefault(sample.name, {})[labels] = sample.value
+    return samples
+
+
+def _merge(snapshots: List[Dict[str, Dict[tuple, float]]]) -> Dict[str, Dict[tuple, float]]:
+    merged: Dict[str, Dict[tuple, float]] = {}
+    for snapshot in snapshots:
+        for name, values in snapshot.items():
+            target = merged.setdefault(name, {})
+            for labels, value in values.items():
+                target[labels] = target.get(labels, 0) + value
+    return merged
+
+
+def _diff(after: dict, before: dict) -> Dict[str, Dict[tuple, float]]:
+    return {
+        name: {
+            labels: value - before.get(name, {}).get(labels, 0)
+            for labels, value in values.items()
+        }
+        for name, values in after.items()
+    }
+
+
+def _total(samples: dict, name: str, **labels) -> float:
+    wanted = set(labels.items())
+    return sum(
+        value for key, value in samples.get(name, {}).items() if wanted <= set(key)
+    )
+
+
+def _quantile(samples: dict, name: str, q: float, **labels) -> Optional[float]:
+    """Квантиль гистограммы с линейной интерполяцией внутри корзины"""
+    wanted = set(labels.items())
+    buckets: Dict[float, float] = {}
+    for key, value in samples.get(f"{name}_bucket", {}).items():
+        if wanted <= set(key):
+            le = float(dict(key)["le"])
+            buckets[le] = buckets.get(le, 0) + value
+    if not buckets:
+        return None
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]]
+    if total <= 0:
+        return None
+    rank = q * total
+    lower, lower_count = 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= rank:
+            if bound == float("inf"):
+                return lower
+            width = count - lower_count
+            fraction = (rank - lower_count) / width if width else 0
+            return round(lower + (bound - lower) * fraction, 6)
+        lower, lower_count = bound, count
+    return lower
+
+
+async def _scrape(http: aiohttp.ClientSession, urls: List[str]) -> Dict[str, Dict[tuple, float]]:
+    snapshots = []
+    for url in urls:
+        async with http.get(url) as response:
+            response.raise_for_status()
+            snapshots.append(_parse_metrics(await response.text()))
+    return _merge(snapshots)
+
+
+# Процессы приложения
+
+def _peak_rss(pid: int) -> Optional[int]:
+    """Максимальный пиковый RSS (VmHWM) процесса и его потомков, байты (только Linux)"""
+    peak = None
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as status:
+                for line in status:
+                    if line.startswith("VmHWM:"):
+                        rss = int(line.split()[1]) * 1024
+                        peak = rss if peak is None else max(peak, rss)
+            with open(f"/proc/{current}/task/{current}/children") as children:
+                pending += [int(child) for child in children.read().split()]
+        except (OSError, ValueError):
+            continue
+    return peak
+
+
+def _start_process(args: List[str], env: dict) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", *args], cwd=ROOT, env=env)
+
+
+def _stop_process(process: subprocess.Popen):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+async def _wait_ready(http: aiohttp.ClientSession, url: str, process: subprocess.Popen,
+                      timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Процесс завершился с кодом {process.returncode}")
+        try:
+            async with http.get(url) as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError(f"{url} не отвечает")
+
+
+# Сценарий
+
+async def _seed_users(http: aiohttp.ClientSession, api_url: str, count: int,
+                      telegram_ratio: float) -> dict:
+    """Создание пользователей через потоковый импорт NDJSON"""
+    run_id = uuid.uuid4().hex[:8]
+
+    async def body():
+        batch = []
+        for i in range(count):
+            user = {"email": f"bench-{run_id}-{i}@example.com"}
+            if random.random() < telegram_ratio:
+                user["telegram_id"] = str(1_000_000_000 + i)
+            batch.append(json.dumps(user))
+            if len(batch) == 1000:
+                yield ("\n".join(batch) + "\n").encode()
+                batch = []
+        if batch:
+            yield ("\n".join(batch) + "\n").encode()
+
+    async with http.post(
+        f"{api_url}/users/bulk", data=body(),
+        headers={"Content-Type": "application/x-ndjson"},
+    ) as response:
+        response.raise_for_status()
+        return await response.json()
+
+
+async def _run_campaign(http: aiohttp.ClientSession, api_url: str, metrics_urls: List[str],
+                        created_after: datetime, priority: str, timeout: float) -> dict:
+    before = await _scrape(http, metrics_urls)
+    started = time.monotonic()
+    payload = {
+        "text": "Benchmark notification",
+        "priority": priority,
+        "audience": {"created_after": created_after.isoformat()},
+    }
+    async with http.post(f"{api_url}/campaigns/", json=payload) as response:
+        response.raise_for_status()
+        campaign = await response.json()
+
+    deadline = started + timeout
+    while True:
+        async with http.get(f"{api_url}/campaigns/{campaign['id']}/status") as response:
+            response.raise_for_status()
+            status = await response.json()
+        if status["completed_at"] is not None:
+            break
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Кампания {campaign['id']} не завершилась за {timeout} с")
+        await asyncio.sleep(0.2)
+    elapsed = time.monotonic() - started
+
+    samples = _diff(await _scrape(http, metrics_urls), before)
+    messages = _total(samples, "notification_send_total", result="success")
+    return {
+        "campaign_id": campaign["id"],
+        "recipients": status["total_notifications"],
+        "sent": status["sent_notifications"],
+        "failed": status["failed_notifications"],
+        "dead_letter": status["dead_letter_notifications"],
+        "elapsed_seconds": round(elapsed, 3),
+        "recipients_per_second": round(status["total_notifications"] / elapsed, 2),
+        "messages": int(messages),
+        "messages_per_second": round(messages / elapsed, 2),
+        "send_latency_seconds": {
+            channel: {
+                "p50": _quantile(samples, "notification_send_seconds", 0.5, channel=channel),
+                "p99": _quantile(samples, "notification_send_seconds", 0.99, channel=channel),
+            }
+            for channel in ("email", "telegram")
+        },
+        "telegram_rate_limited": int(_total(samples, "telegram_rate_limited_total")),
+        "db_round_trips": int(_total(samples, "db_query_seconds_count")),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    telegram = FakeTelegramServer(ChannelBehavior(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        max_rps=args.telegram_max_rps, retry_after=args.retry_after,
+    ))
+    smtp = FakeSMTPServer(ChannelBehavior(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        max_rps=args.smtp_max_rps,
+    ))
+    await telegram.start()
+    smtp.start()
+
+    api_port = free_port()
+    api_url = f"http://127.0.0.1:{api_port}"
+    env = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN="benchmark",
+        TELEGRAM_API_URL=telegram.url,
+        SMTP_HOST=smtp.host,
+        SMTP_PORT=str(smtp.port),
+        SMTP_USERNAME="",
+        SMTP_USE_TLS="false",
+        SMTP_START_TLS="false",
+        WORKER_METRICS_PORT=str(args.metrics_port),
+        LOG_SAMPLE_RATE="0",
+        # Завершение кампании опрашивается через /status: локальный кэш
+        # процесса API показывал бы completed_at с опозданием
+        CACHE_LOCAL_TTL="0",
+        DEBUG="false",
+    )
+    env.update(item.split("=", 1) for item in args.env)
+
+    api = _start_process(
+        ["uvicorn", "app.main:app", "--port", str(api_port), "--log-level", "warning"], env
+    )
+    # -B: встроенный beat для обработки очереди повторов
+    worker = _start_process([
+        "celery", "-A", "app.tasks", "worker", "-B",
+        "-Q", ",".join([*PRIORITY_QUEUES.values(), MAINTENANCE_QUEUE]),
+        "--concurrency", str(args.worker_concurrency), "--loglevel", "warning",
+    ], env)
+    metrics_urls = [
+        f"http://127.0.0.1:{args.metrics_port + index}/metrics"
+        for index in range(args.worker_concurrency)
+    ]
+
+    report = {
+        "commit": _git_commit(),
+        "started_at": datetime.utcnow().isoformat(),
+        "params": {key: value for key, value in vars(args).items() if key != "output"},
+        "campaigns": [],
+    }
+    try:
+        async with aiohttp.ClientSession() as http:
+            await _wait_ready(http, f"{api_url}/", api)
+            for url in metrics_urls:
+                await _wait_ready(http, url, worker)
+
+            for _ in range(args.campaigns):
+                created_after = datetime.utcnow()
+                report.setdefault("seed", []).append(
+                    await _seed_users(http, api_url, args.users, args.telegram_ratio)
+                )
+                report["campaigns"].append(await _run_campaign(
+                    http, api_url, metrics_urls, created_after, args.priority, args.timeout
+                ))
+            report["worker_peak_rss_bytes"] = _peak_rss(worker.pid)
+    finally:
+        _stop_process(worker)
+        _stop_process(api)
+        smtp.stop()
+        await telegram.stop()
+
+    report["fake_servers"] = {
+        name: {
+            "received": server.received,
+            "delivered": server.delivered,
+            "rate_limited": server.rate_limited,
+        }
+        for name, server in (("telegram", telegram), ("smtp", smtp))
+    }
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    args = _parse_args(argv)
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
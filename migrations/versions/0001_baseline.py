@@ -0,0 +1,67 @@
+"""Исходная схема (таблицы, которые создавал create_all при старте API)
+
+Для базы, созданной до появления миграций: alembic stamp 0001
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("telegram_id", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+    op.create_index("ix_users_id", "users", ["id"])
+
+    op.create_table(
+        "campaigns",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("text", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_campaigns_id", "campaigns", ["id"])
+
+    op.create_table(
+        "campaign_users",
+        sa.Column("campaign_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "status",
+            sa.Enum("PENDING", "SENT", "FAILED", name="notificationstatus"),
+            nullable=True,
+        ),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["campaign_id"], ["campaigns.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("campaign_id", "user_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("campaign_users")
+    sa.Enum(name="notificationstatus").drop(op.get_bind())
+    op.drop_index("ix_campaigns_id", table_name="campaigns")
+    op.drop_table("campaigns")
+    op.drop_index("ix_users_id", table_name="users")
+    op.drop_index("ix_users_email", table_name="users")
+    op.drop_table("users")
@@ -0,0 +1,52 @@
+"""Состояние доставки: время рассылки, приоритет, аренда, повторы и dead-letter
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+campaign_priority = sa.Enum("HIGH", "NORMAL", "BULK", name="campaignpriority")
+
+
+def upgrade() -> None:
+    # Новое значение enum нельзя использовать в той же транзакции
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE notificationstatus ADD VALUE IF NOT EXISTS 'DEAD_LETTER'")
+
+    campaign_priority.create(op.get_bind())
+    op.add_column("campaigns", sa.Column("started_at", sa.DateTime(), nullable=True))
+    op.add_column("campaigns", sa.Column("completed_at", sa.DateTime(), nullable=True))
+    op.add_column(
+        "campaigns",
+        sa.Column("priority", campaign_priority, nullable=False, server_default="NORMAL"),
+    )
+
+    op.add_column("campaign_users", sa.Column("lease_expires_at", sa.DateTime(), nullable=True))
+    op.add_column(
+        "campaign_users",
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column("campaign_users", sa.Column("last_error", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("campaign_users", "last_error")
+    op.drop_column("campaign_users", "attempts")
+    op.drop_column("campaign_users", "lease_expires_at")
+    op.drop_column("campaigns", "priority")
+    op.drop_column("campaigns", "completed_at")
+    op.drop_column("campaigns", "started_at")
+    campaign_priority.drop(op.get_bind())
+    # Значение DEAD_LETTER остается в типе notificationstatus:
+    # PostgreSQL не поддерживает удаление значений enum
@@ -0,0 +1,106 @@
+"""Секционирование campaign_users по диапазонам campaign_id и индексы горячих запросов
+
+Существующие получатели переносятся в секционированную таблицу.
+Секции по CAMPAIGN_PARTITION_SIZE кампаний создаются для всех
+существующих кампаний и на PARTITIONS_AHEAD вперед; дальше их заранее
+создает периодическая задача ensure_partitions.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Совпадает с app/services/partitions.py на момент миграции
+CAMPAIGN_PARTITION_SIZE = 1000
+# Совпадает со значением CAMPAIGN_PARTITIONS_AHEAD по умолчанию
+PARTITIONS_AHEAD = 5
+
+COLUMNS = "campaign_id, user_id, status, created_at, sent_at, lease_expires_at, attempts, last_error"
+
+
+def _campaign_users_columns():
+    return [
+        sa.Column("campaign_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "status",
+            postgresql.ENUM(name="notificationstatus", create_type=False),
+            nullable=True,
+        ),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(["campaign_id"], ["campaigns.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("campaign_id", "user_id"),
+    ]
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE campaign_users RENAME TO campaign_users_legacy")
+    op.execute("ALTER INDEX campaign_users_pkey RENAME TO campaign_users_legacy_pkey")
+
+    op.create_table(
+        "campaign_users",
+        *_campaign_users_columns(),
+        postgresql_partition_by="RANGE (campaign_id)",
+    )
+    op.execute("CREATE TABLE campaign_users_default PARTITION OF campaign_users DEFAULT")
+    op.execute(f"""
+        DO $$
+        DECLARE
+            start_id integer;
+        BEGIN
+            FOR start_id IN
+                SELECT id / {CAMPAIGN_PARTITION_SIZE} * {CAMPAIGN_PARTITION_SIZE} FROM campaigns
+                UNION
+                SELECT (last_id / {CAMPAIGN_PARTITION_SIZE} + n) * {CAMPAIGN_PARTITION_SIZE}
+                FROM (SELECT COALESCE(MAX(id), 0) AS last_id FROM campaigns) AS last,
+                    generate_series(0, {PARTITIONS_AHEAD}) AS n
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF campaign_users FOR VALUES FROM (%s) TO (%s)',
+                    'campaign_users_p' || start_id, start_id, start_id + {CAMPAIGN_PARTITION_SIZE}
+                );
+            END LOOP;
+        END $$
+    """)
+    op.execute(
+        f"INSERT INTO campaign_users ({COLUMNS}) SELECT {COLUMNS} FROM campaign_users_legacy"
+    )
+    op.drop_table("campaign_users_legacy")
+
+    # Индексы создаются на родительской таблице и наследуются секциями
+    op.create_index(
+        "ix_campaign_users_campaign_status_user",
+        "campaign_users",
+        ["campaign_id", "status", "user_id"],
+    )
+    op.create_index("ix_users_created_at", "users", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_created_at", table_name="users")
+
+    op.execute("ALTER TABLE campaign_users RENAME TO campaign_users_partitioned")
+    op.execute("ALTER INDEX campaign_users_pkey RENAME TO campaign_users_partitioned_pkey")
+    op.create_table("campaign_users", *_campaign_users_columns())
+    op.execute(
+        f"INSERT INTO campaign_users ({COLUMNS}) SELECT {COLUMNS} FROM campaign_users_partitioned"
+    )
+    # Удаление родительской таблицы удаляет и все ее секции
+    op.drop_table("campaign_users_partitioned")
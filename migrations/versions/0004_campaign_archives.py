@@ -0,0 +1,42 @@
+"""Архив завершенных кампаний
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 15:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("campaigns", sa.Column("archived_at", sa.DateTime(), nullable=True))
+    # Поиск кампаний для архивации по времени завершения
+    op.create_index("ix_campaigns_completed_at", "campaigns", ["completed_at"])
+
+    op.create_table(
+        "campaign_archives",
+        sa.Column("campaign_id", sa.Integer(), sa.ForeignKey("campaigns.id"), primary_key=True),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("sent", sa.Integer(), nullable=False),
+        sa.Column("failed", sa.Integer(), nullable=False),
+        sa.Column("dead_letter", sa.Integer(), nullable=False),
+        sa.Column("first_sent_at", sa.DateTime(), nullable=True),
+        sa.Column("last_sent_at", sa.DateTime(), nullable=True),
+        sa.Column("export_path", sa.String(), nullable=False),
+        sa.Column("archived_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("campaign_archives")
+    op.drop_index("ix_campaigns_completed_at", table_name="campaigns")
+    op.drop_column("campaigns", "archived_at")
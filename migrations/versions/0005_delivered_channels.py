@@ -0,0 +1,35 @@
+"""Каналы, по которым уведомление уже доставлено
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Постоянное значение по умолчанию не требует перезаписи таблицы
+    op.add_column(
+        "campaign_users",
+        sa.Column(
+            "delivered_channels",
+            postgresql.ARRAY(sa.String()),
+            nullable=False,
+            server_default="{}",
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("campaign_users", "delivered_channels")
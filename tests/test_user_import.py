@@ -0,0 +1,45 @@
+import asyncio
+import csv
+from app.services.user_import import iter_csv
+
+
+async def _lines(lines):
+    for line in lines:
+        yield line
+
+
+def _parse(lines):
+    async def collect():
+        return [record async for record in iter_csv(_lines(lines))]
+
+    return asyncio.run(collect())
+
+
+def test_multiline_quoted_value():
+    records = _parse(["email,telegram_id", '"a@example.com', '",1', "b@example.com,2"])
+
+    assert records == [
+        (1, ["email", "telegram_id"]),
+        (2, ["a@example.com\n", "1"]),
+        (4, ["b@example.com", "2"]),
+    ]
+
+
+def test_stray_quote_keeps_following_rows():
+    rows = [f"user{i}@example.com,{i}" for i in range(200)]
+    records = _parse(["email,telegram_id", '"broken@example.com,1', *rows])
+
+    assert records[0] == (1, ["email", "telegram_id"])
+    line_number, error = records[1]
+    assert line_number == 2 and isinstance(error, csv.Error)
+    assert records[2:] == [
+        (i + 3, [f"user{i}@example.com", str(i)]) for i in range(200)
+    ]
+
+
+def test_unterminated_quote_at_end_of_stream():
+    records = _parse(["email,telegram_id", "a@example.com,1", '"b@example.com,2', "c@example.com,3"])
+
+    assert records[1] == (2, ["a@example.com", "1"])
+    assert records[2][0] == 3 and isinstance(records[2][1], csv.Error)
+    assert records[3] == (4, ["c@example.com", "3"])